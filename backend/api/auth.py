@@ -66,7 +66,7 @@ def register():
         return response, 201
         
     except Exception as e:
-        logger.error(f"Registration error: {e}")
+        logger.error("Registration error: %s", e)
         db.session.rollback()
         return jsonify({'error': f'Registration failed: {str(e)}'}), 500
 
@@ -111,7 +111,7 @@ def login():
         return response, 200
         
     except Exception as e:
-        logger.error(f"Login error: {e}")
+        logger.error("Login error: %s", e)
         return jsonify({'error': 'Login failed'}), 500
 
 
@@ -129,7 +129,7 @@ def refresh():
         return response, 200
         
     except Exception as e:
-        logger.error(f"Token refresh error: {e}")
+        logger.error("Token refresh error: %s", e)
         return jsonify({'error': 'Token refresh failed'}), 500
 
 
@@ -141,7 +141,7 @@ def logout():
         unset_jwt_cookies(response)
         return response, 200
     except Exception as e:
-        logger.error(f"Logout error: {e}")
+        logger.error("Logout error: %s", e)
         return jsonify({'error': 'Logout failed'}), 500
 
 
@@ -161,7 +161,7 @@ def get_current_user():
         }), 200
         
     except Exception as e:
-        logger.error(f"Get current user error: {e}")
+        logger.error("Get current user error: %s", e)
         return jsonify({'error': 'Failed to get user'}), 500
 
 
@@ -196,7 +196,7 @@ def update_profile():
         }), 200
         
     except Exception as e:
-        logger.error(f"Profile update error: {e}")
+        logger.error("Profile update error: %s", e)
         db.session.rollback()
         return jsonify({'error': 'Profile update failed'}), 500
 
@@ -228,6 +228,6 @@ def change_password():
         return jsonify({'message': 'Password changed successfully'}), 200
         
     except Exception as e:
-        logger.error(f"Password change error: {e}")
+        logger.error("Password change error: %s", e)
         db.session.rollback()
         return jsonify({'error': 'Password change failed'}), 500
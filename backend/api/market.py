@@ -1,8 +1,9 @@
 """Market overview API endpoints."""
 from flask import Blueprint, request, jsonify, current_app
-from services.stock_data_service import StockDataService
-from services.cache_service import CacheService
+import gevent
 import logging
+from api.utils import conditional_get
+from services.single_flight import SingleFlight
 
 logger = logging.getLogger(__name__)
 
@@ -10,30 +11,118 @@ market_bp = Blueprint('market', __name__, url_prefix='/api/market')
 
 
 def get_services():
-    """Get service instances with cache support."""
-    cache_service = CacheService(
-        current_app.config.get('REDIS_URL'),
-        current_app.config.get('CACHE_DEFAULT_TIMEOUT', 300)
-    )
+    """Get the shared service instances registered by create_app."""
+    return current_app.extensions['stock_service'], current_app.extensions['cache_service']
+
+
+# Background refreshes of stale route caches, at most one per key
+_refreshing = SingleFlight()
+
+# Route cache windows in seconds: (fresh, further stale)
+INDICES_TTL = (60, 18000)
+MOVERS_TTL = (60, 9000)
+
+
+def refresh_market_caches(stock_service, cache_service, limits=(10,)):
+    """
+    Rebuild the indices and US movers caches ahead of user requests.
+    
+    Meant to run on a schedule (see the ``warm-market`` CLI command) so the
+    48-quote movers rebuild is paid at a fixed rate rather than by whoever
+    hits an expired entry.
+    
+    Args:
+        stock_service: Service providing indices and movers
+        cache_service: Cache to write the route entries to
+        limits: Movers list sizes to refresh
+        
+    Returns:
+        Number of cache entries written
+    """
+    written = 0
+    
+    indices = stock_service.get_market_indices()
+    if indices:
+        cache_service.set_swr("market:indices", indices, *INDICES_TTL)
+        written += 1
+    
+    for limit in limits:
+        movers = stock_service.get_top_gainers_losers('US', limit)
+        if movers:
+            cache_service.set_swr(f"market:movers:US:{limit}", movers, *MOVERS_TTL)
+            written += 1
+    
+    return written
+
+
+def revalidate(cache_service, cache_key, fetch, timeout, stale_timeout):
+    """
+    Refresh a stale cache entry on a background greenlet.
     
-    # Pass cache_service to StockDataService for Alpha Vantage caching
-    stock_service = StockDataService(current_app.config, cache_service)
+    Args:
+        cache_service: Cache to write the fresh value to
+        cache_key: Key being revalidated
+        fetch: Zero-argument callable producing the fresh value
+        timeout: Seconds the new value is fresh
+        stale_timeout: Further seconds it may be served stale
+    """
+    if _refreshing.in_flight(cache_key):
+        return
     
-    return stock_service, cache_service
+    def refresh():
+        try:
+            value = fetch()
+            if value:
+                cache_service.set_swr(cache_key, value, timeout, stale_timeout)
+        except Exception as e:
+            logger.error("Background refresh of %s failed: %s", cache_key, e)
+    
+    gevent.spawn(_refreshing.do, cache_key, refresh)
+
+
+def _has_movers(movers):
+    """True if a movers result lists at least one gainer or loser."""
+    return bool(movers and (movers.get('gainers') or movers.get('losers')))
+
+
+def _fetch_and_store(cache_service, cache_key, fetch, ttl, usable=bool):
+    """
+    Fetch a building block and cache it under its own route's key.
+    
+    Runs on a greenlet, so a fetch that outlives the overview's join
+    timeout still fills the cache for the next request.
+    
+    Args:
+        cache_service: Cache to write the value to
+        cache_key: Route cache key for the value
+        fetch: Zero-argument callable producing the value
+        ttl: (fresh, further stale) seconds, as for set_swr
+        usable: Predicate deciding whether the value is worth caching
+        
+    Returns:
+        The fetched value
+    """
+    value = fetch()
+    if usable(value):
+        cache_service.set_swr(cache_key, value, *ttl)
+    return value
 
 
 @market_bp.route('/indices', methods=['GET'])
+@conditional_get(max_age=60)
 def get_indices():
     """Get major market indices."""
     try:
         stock_service, cache_service = get_services()
         
-        # Try cache first
+        # Try cache first; a stale copy is served while it is refreshed
         cache_key = "market:indices"
-        cached_data = cache_service.get(cache_key)
+        cached_data, is_stale = cache_service.get_swr(cache_key)
         
         if cached_data:
-            logger.debug("Cache hit: market indices")
+            logger.debug("Cache hit: market indices (stale: %s)", is_stale)
+            if is_stale:
+                revalidate(cache_service, cache_key, stock_service.get_market_indices, *INDICES_TTL)
             return jsonify({'indices': cached_data}), 200
         
         try:
@@ -41,20 +130,13 @@ def get_indices():
             indices = stock_service.get_market_indices()
             
             if indices:
-                # Cache for 30 minutes (aggressive caching)
-                cache_service.set(cache_key, indices, timeout=1800)
-                # Also set stale backup with 10x TTL
-                cache_service.set(f"{cache_key}:stale", indices, timeout=18000)
+                # Fresh for a minute (quotes underneath are cached per
+                # symbol), then servable stale for 5 hours while revalidating
+                cache_service.set_swr(cache_key, indices, *INDICES_TTL)
                 return jsonify({'indices': indices}), 200
                 
         except Exception as fetch_error:
-            logger.error(f"Error fetching indices: {fetch_error}")
-            
-            # Try stale cache on fetch error
-            stale_data = cache_service.get(f"{cache_key}:stale")
-            if stale_data:
-                logger.warning("Returning stale cache due to fetch error")
-                return jsonify({'indices': stale_data}), 200
+            logger.error("Error fetching indices: %s", fetch_error)
         
         # Last resort: return demo data
         from services.stock_data_service import DEMO_INDICES
@@ -63,11 +145,12 @@ def get_indices():
         return jsonify({'indices': demo_data}), 200
         
     except Exception as e:
-        logger.error(f"Get indices error: {e}")
+        logger.error("Get indices error: %s", e)
         return jsonify({'error': 'Failed to get indices'}), 500
 
 
 @market_bp.route('/movers', methods=['GET'])
+@conditional_get(max_age=60)
 def get_market_movers():
     """Get top gainers and losers."""
     try:
@@ -76,12 +159,18 @@ def get_market_movers():
         
         stock_service, cache_service = get_services()
         
-        # Try cache first
+        # Try cache first; a stale copy is served while it is refreshed
         cache_key = f"market:movers:{market}:{limit}"
-        cached_data = cache_service.get(cache_key)
+        cached_data, is_stale = cache_service.get_swr(cache_key)
         
         if cached_data:
-            logger.debug(f"Cache hit: market movers {market}")
+            logger.debug("Cache hit: market movers %s (stale: %s)", market, is_stale)
+            if is_stale:
+                revalidate(
+                    cache_service, cache_key,
+                    lambda: stock_service.get_top_gainers_losers(market, limit),
+                    *MOVERS_TTL
+                )
             return jsonify(cached_data), 200
         
         try:
@@ -89,57 +178,87 @@ def get_market_movers():
             movers = stock_service.get_top_gainers_losers(market, limit)
             
             if movers:
-                # Cache for 15 minutes
-                cache_service.set(cache_key, movers, timeout=900)
-                # Stale backup
-                cache_service.set(f"{cache_key}:stale", movers, timeout=9000)
+                # Fresh for a minute, then servable stale for 2.5 hours
+                cache_service.set_swr(cache_key, movers, *MOVERS_TTL)
                 return jsonify(movers), 200
                 
         except Exception as fetch_error:
-            logger.error(f"Error fetching movers: {fetch_error}")
-            
-            # Try stale cache
-            stale_data = cache_service.get(f"{cache_key}:stale")
-            if stale_data:
-                logger.warning("Returning stale movers cache")
-                return jsonify(stale_data), 200
+            logger.error("Error fetching movers: %s", fetch_error)
         
         # Return empty movers as fallback
         return jsonify({'gainers': [], 'losers': []}), 200
         
     except Exception as e:
-        logger.error(f"Get market movers error: {e}")
+        logger.error("Get market movers error: %s", e)
         return jsonify({'gainers': [], 'losers': []}), 200
 
 
 @market_bp.route('/overview', methods=['GET'])
+@conditional_get(max_age=60)
 def get_market_overview():
     """Get comprehensive market overview."""
     try:
         stock_service, cache_service = get_services()
         
-        # Try cache first
+        # Read the overview and its building blocks in one round-trip
         cache_key = "market:overview"
-        cached_data = cache_service.get(cache_key)
+        indices_key = "market:indices"
+        movers_key = "market:movers:US:10"
+        (cached_data, _), (indices, indices_stale), (movers, movers_stale) = cache_service.mget_swr(
+            [cache_key, indices_key, movers_key]
+        )
         
         if cached_data:
             return jsonify(cached_data), 200
         
-        # Fetch indices
-        indices = stock_service.get_market_indices()
+        # Stale building blocks are served while refreshed in the background
+        if indices and indices_stale:
+            revalidate(cache_service, indices_key, stock_service.get_market_indices, *INDICES_TTL)
+        if movers and movers_stale:
+            revalidate(
+                cache_service, movers_key,
+                lambda: stock_service.get_top_gainers_losers('US', 10),
+                *MOVERS_TTL
+            )
+        
+        # Fetch the pieces that missed concurrently, so latency is the
+        # slowest upstream call rather than the sum of them
+        jobs = {}
+        if not indices:
+            jobs['indices'] = gevent.spawn(
+                _fetch_and_store, cache_service, indices_key,
+                stock_service.get_market_indices, INDICES_TTL
+            )
+        if not movers:
+            jobs['movers'] = gevent.spawn(
+                _fetch_and_store, cache_service, movers_key,
+                lambda: stock_service.get_top_gainers_losers('US', 10), MOVERS_TTL, _has_movers
+            )
+        gevent.joinall(list(jobs.values()), timeout=3)
+        
+        # Jobs still running after the timeout keep going and cache their
+        # block under its route key; this response just goes out without it
+        if 'indices' in jobs:
+            indices = jobs['indices'].value or []
+        if 'movers' in jobs:
+            movers = jobs['movers'].value or {}
         
         overview = {
             'indices': indices,
-            'gainers': [],
-            'losers': [],
+            'gainers': movers.get('gainers', []),
+            'losers': movers.get('losers', []),
             'most_active': []
         }
         
-        # Cache for 2 minutes
-        cache_service.set(cache_key, overview, timeout=120)
+        # Cache for 2 minutes, no stale window. Only complete overviews
+        # built from fresh blocks: an empty block (upstream down or rate
+        # limited) or a stale one is rebuilt on the next request instead
+        complete = bool(indices) and _has_movers(movers)
+        if complete and not (indices_stale or movers_stale):
+            cache_service.set_swr(cache_key, overview, 120, 0)
         
         return jsonify(overview), 200
         
     except Exception as e:
-        logger.error(f"Get market overview error: {e}")
+        logger.error("Get market overview error: %s", e)
         return jsonify({'error': 'Failed to get market overview'}), 500
@@ -1,9 +1,13 @@
 """Portfolio API endpoints."""
-from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask import Blueprint, request, jsonify, current_app
+from flask_jwt_extended import get_jwt_identity
+from sqlalchemy import case, delete, func, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import selectinload
 from models import db
 from models.portfolio import Portfolio, Position, Transaction
 from models.stock import Stock
+from api.utils import PageArgs, cached_jwt_required, stock_id_by_symbol
 from datetime import datetime
 import logging
 
@@ -12,25 +16,51 @@ logger = logging.getLogger(__name__)
 portfolio_bp = Blueprint('portfolio', __name__, url_prefix='/api/portfolio')
 
 
+def get_user_portfolio(portfolio_id, user_id, *options):
+    """Get a portfolio if it belongs to the user, else None.
+    
+    ``options`` are loader options applied to the query, e.g. eager loads.
+    """
+    return db.session.execute(
+        select(Portfolio)
+        .where(Portfolio.id == portfolio_id, Portfolio.user_id == user_id)
+        .options(*options)
+    ).scalar_one_or_none()
+
+
+def user_owns_portfolio(portfolio_id, user_id):
+    """Check portfolio ownership without loading the portfolio row."""
+    return db.session.execute(
+        select(Portfolio.id).where(Portfolio.id == portfolio_id, Portfolio.user_id == user_id)
+    ).first() is not None
+
+
 @portfolio_bp.route('/', methods=['GET'])
-@jwt_required()
+@cached_jwt_required()
 def list_portfolios():
     """List all user portfolios."""
     try:
         user_id = get_jwt_identity()
-        portfolios = Portfolio.query.filter_by(user_id=user_id).all()
+        portfolios = db.session.execute(
+            select(Portfolio).where(Portfolio.user_id == user_id)
+        ).scalars().all()
+        
+        # One aggregate query for every portfolio instead of one per portfolio
+        stats = Portfolio.compute_stats_bulk([p.id for p in portfolios])
         
         return jsonify({
-            'portfolios': [p.to_dict(include_stats=True) for p in portfolios]
+            'portfolios': [
+                p.to_dict(include_stats=True, stats=stats[p.id]) for p in portfolios
+            ]
         }), 200
         
     except Exception as e:
-        logger.error(f"List portfolios error: {e}")
+        logger.error("List portfolios error: %s", e)
         return jsonify({'error': 'Failed to list portfolios'}), 500
 
 
 @portfolio_bp.route('/', methods=['POST'])
-@jwt_required()
+@cached_jwt_required()
 def create_portfolio():
     """Create a new portfolio."""
     try:
@@ -57,18 +87,25 @@ def create_portfolio():
         }), 201
         
     except Exception as e:
-        logger.error(f"Create portfolio error: {e}")
+        logger.error("Create portfolio error: %s", e)
         db.session.rollback()
         return jsonify({'error': 'Failed to create portfolio'}), 500
 
 
 @portfolio_bp.route('/<int:portfolio_id>', methods=['GET'])
-@jwt_required()
+@cached_jwt_required()
 def get_portfolio(portfolio_id):
     """Get portfolio details."""
     try:
         user_id = get_jwt_identity()
-        portfolio = Portfolio.query.filter_by(id=portfolio_id, user_id=user_id).first()
+        # Positions and their stocks in one extra query, not one per position;
+        # stocks only hydrate the columns Stock.serialize reads
+        portfolio = get_user_portfolio(
+            portfolio_id, user_id,
+            selectinload(Portfolio.positions)
+            .joinedload(Position.stock)
+            .load_only(*Stock.list_columns())
+        )
         
         if not portfolio:
             return jsonify({'error': 'Portfolio not found'}), 404
@@ -78,19 +115,17 @@ def get_portfolio(portfolio_id):
         }), 200
         
     except Exception as e:
-        logger.error(f"Get portfolio error: {e}")
+        logger.error("Get portfolio error: %s", e)
         return jsonify({'error': 'Failed to get portfolio'}), 500
 
 
 @portfolio_bp.route('/<int:portfolio_id>/positions', methods=['POST'])
-@jwt_required()
+@cached_jwt_required()
 def add_position(portfolio_id):
     """Add or update a position in portfolio."""
     try:
         user_id = get_jwt_identity()
-        portfolio = Portfolio.query.filter_by(id=portfolio_id, user_id=user_id).first()
-        
-        if not portfolio:
+        if not user_owns_portfolio(portfolio_id, user_id):
             return jsonify({'error': 'Portfolio not found'}), 404
         
         data = request.get_json()
@@ -99,18 +134,20 @@ def add_position(portfolio_id):
         if not all(k in data for k in ['symbol', 'quantity', 'price']):
             return jsonify({'error': 'Missing required fields'}), 400
         
-        # Get or create stock
-        stock = Stock.query.filter_by(symbol=data['symbol'].upper()).first()
-        if not stock:
+        stock_id = stock_id_by_symbol(data['symbol'].upper())
+        if stock_id is None:
             return jsonify({'error': 'Stock not found'}), 404
         
+        quantity = float(data['quantity'])
+        price = float(data['price'])
+        
         # Create transaction
         transaction = Transaction(
-            portfolio_id=portfolio.id,
-            stock_id=stock.id,
+            portfolio_id=portfolio_id,
+            stock_id=stock_id,
             transaction_type='BUY',
-            quantity=float(data['quantity']),
-            price=float(data['price']),
+            quantity=quantity,
+            price=price,
             fees=float(data.get('fees', 0)),
             notes=data.get('notes'),
             transaction_date=datetime.fromisoformat(data['transaction_date']) if 'transaction_date' in data else datetime.utcnow()
@@ -118,27 +155,34 @@ def add_position(portfolio_id):
         
         db.session.add(transaction)
         
-        # Update or create position
-        position = Position.query.filter_by(
-            portfolio_id=portfolio.id,
-            stock_id=stock.id
-        ).first()
-        
-        if position:
-            # Update average price and quantity
-            total_cost = (position.quantity * position.average_price) + (transaction.quantity * transaction.price)
-            new_quantity = position.quantity + transaction.quantity
-            position.average_price = total_cost / new_quantity if new_quantity > 0 else 0
-            position.quantity = new_quantity
-        else:
-            # Create new position
-            position = Position(
-                portfolio_id=portfolio.id,
-                stock_id=stock.id,
-                quantity=transaction.quantity,
-                average_price=transaction.price
-            )
-            db.session.add(position)
+        # Insert the position or fold the buy into it in a single statement;
+        # the new average price is computed by the database, so concurrent
+        # buys of the same stock cannot race each other
+        insert_stmt = pg_insert(Position).values(
+            portfolio_id=portfolio_id,
+            stock_id=stock_id,
+            quantity=quantity,
+            average_price=price
+        )
+        excluded = insert_stmt.excluded
+        new_quantity = Position.quantity + excluded.quantity
+        upsert_stmt = insert_stmt.on_conflict_do_update(
+            index_elements=['portfolio_id', 'stock_id'],
+            set_={
+                'quantity': new_quantity,
+                'average_price': case(
+                    (
+                        new_quantity > 0,
+                        (Position.quantity * Position.average_price
+                         + excluded.quantity * excluded.average_price) / new_quantity
+                    ),
+                    else_=0
+                ),
+                'updated_at': func.now()
+            }
+        ).returning(Position).execution_options(populate_existing=True)
+        
+        position = db.session.execute(upsert_stmt).scalar_one()
         
         db.session.commit()
         
@@ -149,61 +193,53 @@ def add_position(portfolio_id):
         }), 201
         
     except Exception as e:
-        logger.error(f"Add position error: {e}")
+        logger.error("Add position error: %s", e)
         db.session.rollback()
         return jsonify({'error': 'Failed to add position'}), 500
 
 
 @portfolio_bp.route('/<int:portfolio_id>/transactions', methods=['GET'])
-@jwt_required()
+@cached_jwt_required()
 def get_transactions(portfolio_id):
     """Get portfolio transaction history."""
     try:
         user_id = get_jwt_identity()
-        portfolio = Portfolio.query.filter_by(id=portfolio_id, user_id=user_id).first()
-        
-        if not portfolio:
+        if not user_owns_portfolio(portfolio_id, user_id):
             return jsonify({'error': 'Portfolio not found'}), 404
         
-        page = int(request.args.get('page', 1))
-        per_page = min(int(request.args.get('per_page', 50)), 100)
-        
-        pagination = portfolio.transactions.order_by(
-            Transaction.transaction_date.desc()
-        ).paginate(page=page, per_page=per_page, error_out=False)
+        paging = PageArgs.from_request()
         
-        transactions = [t.to_dict() for t in pagination.items]
+        # PostgreSQL builds the whole JSON body; no ORM rows or Python encoding
+        body = Transaction.page_json(portfolio_id, paging.page, paging.per_page)
         
-        return jsonify({
-            'transactions': transactions,
-            'total': pagination.total,
-            'page': page,
-            'per_page': per_page,
-            'pages': pagination.pages
-        }), 200
+        return current_app.response_class(body, status=200, mimetype='application/json')
         
     except Exception as e:
-        logger.error(f"Get transactions error: {e}")
+        logger.error("Get transactions error: %s", e)
         return jsonify({'error': 'Failed to get transactions'}), 500
 
 
 @portfolio_bp.route('/<int:portfolio_id>', methods=['DELETE'])
-@jwt_required()
+@cached_jwt_required()
 def delete_portfolio(portfolio_id):
     """Delete a portfolio."""
     try:
         user_id = get_jwt_identity()
-        portfolio = Portfolio.query.filter_by(id=portfolio_id, user_id=user_id).first()
+        # Single DELETE; positions and transactions go with it through the
+        # ON DELETE CASCADE foreign keys
+        result = db.session.execute(
+            delete(Portfolio).where(Portfolio.id == portfolio_id, Portfolio.user_id == user_id)
+        )
         
-        if not portfolio:
+        if result.rowcount == 0:
+            db.session.rollback()
             return jsonify({'error': 'Portfolio not found'}), 404
         
-        db.session.delete(portfolio)
         db.session.commit()
         
         return jsonify({'message': 'Portfolio deleted'}), 200
         
     except Exception as e:
-        logger.error(f"Delete portfolio error: {e}")
+        logger.error("Delete portfolio error: %s", e)
         db.session.rollback()
         return jsonify({'error': 'Failed to delete portfolio'}), 500
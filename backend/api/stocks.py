@@ -1,12 +1,14 @@
 """Stock data API endpoints."""
 from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from services.stock_data_service import StockDataService
+from sqlalchemy import select, func
 from services.technical_analysis import TechnicalAnalysisService
-from services.cache_service import CacheService
+from services.cache_service import hashed_key
+from api.utils import PageArgs, conditional_get
 from models import db
 from models.stock import Stock, StockPriceData, TechnicalIndicator
 from datetime import datetime, timedelta
+import math
 import logging
 
 logger = logging.getLogger(__name__)
@@ -15,16 +17,12 @@ stocks_bp = Blueprint('stocks', __name__, url_prefix='/api/stocks')
 
 
 def get_services():
-    """Get service instances."""
-    stock_service = StockDataService(current_app.config)
-    cache_service = CacheService(
-        current_app.config.get('REDIS_URL'),
-        current_app.config.get('STOCK_DATA_CACHE_TIMEOUT', 60)
-    )
-    return stock_service, cache_service
+    """Get the shared service instances registered by create_app."""
+    return current_app.extensions['stock_service'], current_app.extensions['cache_service']
 
 
 @stocks_bp.route('/search', methods=['GET'])
+@conditional_get(max_age=300)
 def search_stocks():
     """Search for stocks by symbol or name."""
     try:
@@ -36,8 +34,8 @@ def search_stocks():
         
         stock_service, cache_service = get_services()
         
-        # Try cache first
-        cache_key = f"search:{query}:{limit}"
+        # Try cache first; normalize case/whitespace so equivalent queries share a key
+        cache_key = hashed_key('search', ' '.join(query.lower().split()), limit)
         cached_results = cache_service.get(cache_key)
         
         if cached_results:
@@ -52,53 +50,43 @@ def search_stocks():
         return jsonify({'results': results}), 200
         
     except Exception as e:
-        logger.error(f"Stock search error: {e}")
+        logger.error("Stock search error: %s", e)
         return jsonify({'error': 'Search failed'}), 500
 
 
-@stocks_bp.route('/<symbol>/quote', methods=['GET'])
+@stocks_bp.route('/<sym:symbol>/quote', methods=['GET'])
+@conditional_get(max_age=60)
 def get_stock_quote(symbol):
     """Get real-time quote for a stock."""
     try:
-        symbol = symbol.upper()
-        stock_service, cache_service = get_services()
-        
-        # Try cache first
-        cache_key = f"quote:{symbol}"
-        cached_quote = cache_service.get(cache_key)
-        
-        if cached_quote:
-            return jsonify(cached_quote), 200
+        stock_service, _ = get_services()
         
-        # Fetch quote
+        # Quotes are cached per symbol (1 minute fresh) by the service
         quote = stock_service.get_quote(symbol)
         
         if not quote:
             return jsonify({'error': 'Stock not found'}), 404
         
-        # Cache for 1 minute
-        cache_service.set(cache_key, quote, timeout=60)
-        
         return jsonify(quote), 200
         
     except Exception as e:
-        logger.error(f"Get quote error for {symbol}: {e}")
+        logger.error("Get quote error for %s: %s", symbol, e)
         db.session.rollback()
         return jsonify({'error': 'Failed to get quote'}), 500
 
 
-@stocks_bp.route('/<symbol>/historical', methods=['GET'])
+@stocks_bp.route('/<sym:symbol>/historical', methods=['GET'])
+@conditional_get(max_age=300)
 def get_historical_data(symbol):
     """Get historical price data for a stock."""
     try:
-        symbol = symbol.upper()
         period = request.args.get('period', '1y')
         interval = request.args.get('interval', '1d')
         
         stock_service, cache_service = get_services()
         
         # Try cache first
-        cache_key = f"historical:{symbol}:{period}:{interval}"
+        cache_key = hashed_key('historical', symbol, period, interval)
         cached_data = cache_service.get(cache_key)
         
         if cached_data:
@@ -116,15 +104,15 @@ def get_historical_data(symbol):
         return jsonify({'symbol': symbol, 'data': data}), 200
         
     except Exception as e:
-        logger.error(f"Get historical data error for {symbol}: {e}")
+        logger.error("Get historical data error for %s: %s", symbol, e)
         return jsonify({'error': 'Failed to get historical data'}), 500
 
 
-@stocks_bp.route('/<symbol>/info', methods=['GET'])
+@stocks_bp.route('/<sym:symbol>/info', methods=['GET'])
+@conditional_get(max_age=3600)
 def get_company_info(symbol):
     """Get detailed company information."""
     try:
-        symbol = symbol.upper()
         stock_service, cache_service = get_services()
         
         # Try cache first
@@ -146,15 +134,15 @@ def get_company_info(symbol):
         return jsonify(info), 200
         
     except Exception as e:
-        logger.error(f"Get company info error for {symbol}: {e}")
+        logger.error("Get company info error for %s: %s", symbol, e)
         return jsonify({'error': 'Failed to get company info'}), 500
 
 
-@stocks_bp.route('/<symbol>/indicators', methods=['GET'])
+@stocks_bp.route('/<sym:symbol>/indicators', methods=['GET'])
+@conditional_get(max_age=300)
 def get_technical_indicators(symbol):
     """Get technical indicators for a stock."""
     try:
-        symbol = symbol.upper()
         stock_service, cache_service = get_services()
         
         # Try cache first
@@ -171,46 +159,68 @@ def get_technical_indicators(symbol):
             return jsonify({'error': 'Insufficient data for analysis'}), 404
         
         # Calculate indicators
-        indicators = TechnicalAnalysisService.calculate_all_indicators(historical_data)
+        result = {
+            'symbol': symbol,
+            'indicators': TechnicalAnalysisService.calculate_all_indicators(historical_data)
+        }
         
-        # Cache for 5 minutes
-        cache_service.set(cache_key, indicators, timeout=300)
+        # Cache the response body for 5 minutes
+        cache_service.set(cache_key, result, timeout=300)
         
-        return jsonify({'symbol': symbol, 'indicators': indicators}), 200
+        return jsonify(result), 200
         
     except Exception as e:
-        logger.error(f"Get indicators error for {symbol}: {e}")
+        logger.error("Get indicators error for %s: %s", symbol, e)
         return jsonify({'error': 'Failed to calculate indicators'}), 500
 
 
 @stocks_bp.route('/list', methods=['GET'])
+@conditional_get(max_age=60)
 def list_stocks():
     """List all stocks in database with pagination."""
     try:
-        page = int(request.args.get('page', 1))
-        per_page = min(int(request.args.get('per_page', 50)), 100)
+        paging = PageArgs.from_request()
         market = request.args.get('market')
         exchange = request.args.get('exchange')
         
-        query = Stock.query.filter_by(is_active=True)
+        filters = [Stock.is_active.is_(True)]
         
         if market:
-            query = query.filter_by(market=market.upper())
+            market = market.upper()
+            filters.append(Stock.market == market)
         if exchange:
-            query = query.filter_by(exchange=exchange.upper())
-        
-        pagination = query.paginate(page=page, per_page=per_page, error_out=False)
-        
-        stocks = [stock.to_dict() for stock in pagination.items]
+            exchange = exchange.upper()
+            filters.append(Stock.exchange == exchange)
+        
+        # Select plain columns instead of hydrating ORM objects
+        stmt = (
+            select(*Stock.list_columns())
+            .where(*filters)
+            .order_by(Stock.id)
+            .limit(paging.per_page)
+            .offset(paging.offset)
+        )
+        stocks = [Stock.serialize(row) for row in db.session.execute(stmt)]
+        
+        # The stock universe changes rarely, so cache the count briefly
+        _, cache_service = get_services()
+        count_key = f"stocks:count:{market}:{exchange}"
+        total = cache_service.get(count_key)
+        
+        if total is None:
+            total = db.session.execute(
+                select(func.count()).select_from(Stock).where(*filters)
+            ).scalar_one()
+            cache_service.set(count_key, total, timeout=60)
         
         return jsonify({
             'stocks': stocks,
-            'total': pagination.total,
-            'page': page,
-            'per_page': per_page,
-            'pages': pagination.pages
+            'total': total,
+            'page': paging.page,
+            'per_page': paging.per_page,
+            'pages': math.ceil(total / paging.per_page)
         }), 200
         
     except Exception as e:
-        logger.error(f"List stocks error: {e}")
+        logger.error("List stocks error: %s", e)
         return jsonify({'error': 'Failed to list stocks'}), 500
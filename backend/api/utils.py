@@ -0,0 +1,221 @@
+"""Shared request parsing and response helpers for API blueprints."""
+import hashlib
+import re
+import time
+from dataclasses import dataclass
+from functools import wraps
+from cachetools import LRUCache, TTLCache
+from flask import current_app, g, request, make_response
+from flask_jwt_extended import verify_jwt_in_request
+from flask_jwt_extended.config import config as jwt_config
+from flask_jwt_extended.internal_utils import (
+    custom_verification_for_token,
+    verify_token_not_blocklisted,
+    verify_token_type,
+)
+from flask_jwt_extended.view_decorators import _load_user
+from sqlalchemy import bindparam, select
+from werkzeug.routing import BaseConverter
+from models import db
+from models.stock import Stock
+
+# Symbol -> stocks.id, shared across requests in this worker. Stock ids never
+# change once assigned, so entries need no expiry; unknown symbols are not
+# cached, which means a newly created stock is picked up on its first lookup.
+_stock_ids = LRUCache(maxsize=8192)
+
+_STOCK_ID_BY_SYMBOL = select(Stock.id).where(Stock.symbol == bindparam('symbol'))
+
+# Flask-Compress appends the content coding to the ETag ("<hash>:gzip"),
+# and clients send that form back in If-None-Match
+_ENCODING_SUFFIX = re.compile(r':(?:gzip|br|deflate)$')
+
+# Decoded (header, payload) of access tokens already verified by this worker,
+# keyed by a digest of the raw token
+_verified_tokens = TTLCache(maxsize=10000, ttl=60)
+
+
+class SymbolConverter(BaseConverter):
+    """URL converter that validates a ticker symbol and upper-cases it."""
+    
+    # Matches Stock.symbol (String(20)), e.g. AAPL, BRK.B, RELIANCE.NS
+    regex = r'[A-Za-z0-9.\-]{1,20}'
+    
+    def to_python(self, value):
+        """Canonicalize the symbol once during routing."""
+        return value.upper()
+    
+    def to_url(self, value):
+        """Build URLs with the canonical symbol."""
+        return super().to_url(value.upper())
+
+
+@dataclass(frozen=True)
+class PageArgs:
+    """Pagination arguments parsed from the query string."""
+    
+    page: int
+    per_page: int
+    
+    @property
+    def offset(self):
+        """Row offset of the first item on the page."""
+        return (self.page - 1) * self.per_page
+    
+    @classmethod
+    def from_request(cls, default_per_page=50, max_per_page=100):
+        """
+        Parse ``page`` and ``per_page`` from the current request.
+        
+        Invalid values fall back to the defaults; both are clamped to sane bounds.
+        """
+        page = request.args.get('page', 1, type=int)
+        per_page = request.args.get('per_page', default_per_page, type=int)
+        return cls(page=max(page, 1), per_page=max(min(per_page, max_per_page), 1))
+
+
+def _etag_matches(etag):
+    """True if the request's If-None-Match names etag (in any content coding)."""
+    client_etags = request.if_none_match
+    if client_etags.star_tag:
+        return True
+    return any(
+        _ENCODING_SUFFIX.sub('', tag) == etag
+        for tag in client_etags.as_set(include_weak=True)
+    )
+
+
+def _not_modified(etag, max_age):
+    """Empty 304 carrying the validators of the unchanged response."""
+    response = current_app.response_class(status=304)
+    response.set_etag(etag)
+    response.cache_control.max_age = max_age
+    return response
+
+
+def conditional_get(max_age=60):
+    """
+    Decorator adding a content ETag to successful GET responses.
+    
+    Clients that send a matching ``If-None-Match`` get an empty 304 instead
+    of the full body. The ETag of the last body served for a URL is kept in
+    the cache for ``max_age`` seconds, so a revalidation within that window
+    is answered before the view builds or hashes anything. That is the same
+    freshness ``max-age`` already grants the client, so it never serves a
+    304 the client could not have skipped asking for. Only use on responses
+    that do not vary by user.
+    
+    Args:
+        max_age: Cache-Control max-age in seconds
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            cacheable = request.method in ('GET', 'HEAD')
+            cache_service = current_app.extensions.get('cache_service')
+            etag_key = None
+            
+            if cacheable and cache_service:
+                etag_key = 'etag:' + hashlib.blake2b(request.full_path.encode(), digest_size=16).hexdigest()
+                if request.if_none_match:
+                    stored = cache_service.get(etag_key)
+                    if stored and _etag_matches(stored):
+                        return _not_modified(stored, max_age)
+            
+            response = make_response(view(*args, **kwargs))
+            
+            if cacheable and response.status_code == 200:
+                etag = hashlib.blake2b(response.get_data(), digest_size=8).hexdigest()
+                if etag_key:
+                    cache_service.set(etag_key, etag, timeout=max_age)
+                if _etag_matches(etag):
+                    return _not_modified(etag, max_age)
+                response.set_etag(etag)
+                response.cache_control.max_age = max_age
+            
+            return response
+        
+        return wrapper
+    return decorator
+
+
+def stock_id_by_symbol(symbol):
+    """
+    Resolve a ticker symbol to its ``stocks.id``.
+    
+    Checks the per-worker map, then the ``stock:symbols`` Redis hash shared by
+    all workers, and only then the database.
+    
+    Args:
+        symbol: Upper-cased ticker symbol
+        
+    Returns:
+        Stock id, or None if the symbol is unknown
+    """
+    stock_id = _stock_ids.get(symbol)
+    if stock_id is not None:
+        return stock_id
+    
+    cache_service = current_app.extensions['cache_service']
+    cached_id = cache_service.hget('stock:symbols', symbol)
+    
+    if cached_id is not None:
+        stock_id = int(cached_id)
+    else:
+        stock_id = db.session.execute(_STOCK_ID_BY_SYMBOL, {'symbol': symbol}).scalar()
+        if stock_id is None:
+            return None
+        cache_service.hset('stock:symbols', symbol, stock_id)
+    
+    _stock_ids[symbol] = stock_id
+    return stock_id
+
+
+def cached_jwt_required():
+    """
+    Decorator equivalent to ``jwt_required()`` that skips re-verifying the
+    signature of an access token this worker has recently accepted.
+    
+    A cache hit skips only the signature check: expiry, token type, the
+    blocklist, claims verification and user lookup run on every request,
+    the same as in ``verify_jwt_in_request()``, and the result is stored in
+    the request context so ``get_jwt_identity()``/``get_current_user()``
+    work unchanged. Falls back to full verification when CSRF protection is
+    on, since that check depends on each request.
+    
+    The hit path fills Flask-JWT-Extended's request-context attributes
+    itself, which ties it to the pinned library version (see
+    requirements.txt); tests/test_cached_jwt_required.py covers it.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            token = request.cookies.get(current_app.config['JWT_ACCESS_COOKIE_NAME'])
+            
+            if (not token or current_app.config.get('JWT_COOKIE_CSRF_PROTECT')
+                    or request.method in jwt_config.exempt_methods):
+                verify_jwt_in_request()
+                return current_app.ensure_sync(view)(*args, **kwargs)
+            
+            key = hashlib.blake2b(token.encode(), digest_size=16).digest()
+            cached = _verified_tokens.get(key)
+            
+            if cached is not None and cached[1].get('exp', 0) > time.time():
+                jwt_header, jwt_data = cached
+                verify_token_type(jwt_data, refresh=False)
+                verify_token_not_blocklisted(jwt_header, jwt_data)
+                custom_verification_for_token(jwt_header, jwt_data)
+                # Same assignments as the end of verify_jwt_in_request()
+                g._jwt_extended_jwt_user = _load_user(jwt_header, jwt_data)
+                g._jwt_extended_jwt_header = jwt_header
+                g._jwt_extended_jwt = jwt_data
+                g._jwt_extended_jwt_location = 'cookies'
+            else:
+                verified = verify_jwt_in_request()
+                if verified is not None:
+                    _verified_tokens[key] = verified
+            
+            return current_app.ensure_sync(view)(*args, **kwargs)
+        
+        return wrapper
+    return decorator
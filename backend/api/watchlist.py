@@ -1,9 +1,11 @@
 """Watchlist API endpoints."""
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask_jwt_extended import get_jwt_identity
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from models import db
 from models.watchlist import Watchlist, WatchlistItem
-from models.stock import Stock
+from api.utils import cached_jwt_required, stock_id_by_symbol
 import logging
 
 logger = logging.getLogger(__name__)
@@ -11,25 +13,41 @@ logger = logging.getLogger(__name__)
 watchlist_bp = Blueprint('watchlist', __name__, url_prefix='/api/watchlist')
 
 
+def get_user_watchlist(watchlist_id, user_id):
+    """Get a watchlist if it belongs to the user, else None."""
+    return db.session.execute(
+        select(Watchlist).where(Watchlist.id == watchlist_id, Watchlist.user_id == user_id)
+    ).scalar_one_or_none()
+
+
+def user_owns_watchlist(watchlist_id, user_id):
+    """Check watchlist ownership without loading the watchlist row."""
+    return db.session.execute(
+        select(Watchlist.id).where(Watchlist.id == watchlist_id, Watchlist.user_id == user_id)
+    ).first() is not None
+
+
 @watchlist_bp.route('/', methods=['GET'])
-@jwt_required()
+@cached_jwt_required()
 def list_watchlists():
     """List all user watchlists."""
     try:
         user_id = get_jwt_identity()
-        watchlists = Watchlist.query.filter_by(user_id=user_id).all()
+        watchlists = db.session.execute(
+            select(Watchlist).where(Watchlist.user_id == user_id)
+        ).scalars().all()
         
         return jsonify({
             'watchlists': [w.to_dict() for w in watchlists]
         }), 200
         
     except Exception as e:
-        logger.error(f"List watchlists error: {e}")
+        logger.error("List watchlists error: %s", e)
         return jsonify({'error': 'Failed to list watchlists'}), 500
 
 
 @watchlist_bp.route('/', methods=['POST'])
-@jwt_required()
+@cached_jwt_required()
 def create_watchlist():
     """Create a new watchlist."""
     try:
@@ -54,18 +72,18 @@ def create_watchlist():
         }), 201
         
     except Exception as e:
-        logger.error(f"Create watchlist error: {e}")
+        logger.error("Create watchlist error: %s", e)
         db.session.rollback()
         return jsonify({'error': 'Failed to create watchlist'}), 500
 
 
 @watchlist_bp.route('/<int:watchlist_id>', methods=['GET'])
-@jwt_required()
+@cached_jwt_required()
 def get_watchlist(watchlist_id):
     """Get watchlist details with items."""
     try:
         user_id = get_jwt_identity()
-        watchlist = Watchlist.query.filter_by(id=watchlist_id, user_id=user_id).first()
+        watchlist = get_user_watchlist(watchlist_id, user_id)
         
         if not watchlist:
             return jsonify({'error': 'Watchlist not found'}), 404
@@ -75,19 +93,17 @@ def get_watchlist(watchlist_id):
         }), 200
         
     except Exception as e:
-        logger.error(f"Get watchlist error: {e}")
+        logger.error("Get watchlist error: %s", e)
         return jsonify({'error': 'Failed to get watchlist'}), 500
 
 
 @watchlist_bp.route('/<int:watchlist_id>/items', methods=['POST'])
-@jwt_required()
+@cached_jwt_required()
 def add_to_watchlist(watchlist_id):
     """Add a stock to watchlist."""
     try:
         user_id = get_jwt_identity()
-        watchlist = Watchlist.query.filter_by(id=watchlist_id, user_id=user_id).first()
-        
-        if not watchlist:
+        if not user_owns_watchlist(watchlist_id, user_id):
             return jsonify({'error': 'Watchlist not found'}), 404
         
         data = request.get_json()
@@ -95,30 +111,26 @@ def add_to_watchlist(watchlist_id):
         if not data.get('symbol'):
             return jsonify({'error': 'Stock symbol required'}), 400
         
-        # Get or create stock
-        stock = Stock.query.filter_by(symbol=data['symbol'].upper()).first()
-        if not stock:
+        symbol = data['symbol'].upper()
+        if stock_id_by_symbol(symbol) is None:
             return jsonify({'error': 'Stock not found'}), 404
         
-        # Check if already in watchlist
-        existing = WatchlistItem.query.filter_by(
-            watchlist_id=watchlist.id,
-            stock_id=stock.id
-        ).first()
+        # Insert unless already present; uq_watchlist_symbol turns the
+        # duplicate check into part of the INSERT, so there is no race window
+        insert_stmt = pg_insert(WatchlistItem).values(
+            watchlist_id=watchlist_id,
+            symbol=symbol,
+            notes=data.get('notes')
+        ).on_conflict_do_nothing(
+            index_elements=['watchlist_id', 'symbol']
+        ).returning(WatchlistItem)
         
-        if existing:
-            return jsonify({'error': 'Stock already in watchlist'}), 409
+        item = db.session.execute(insert_stmt).scalar_one_or_none()
         
-        # Add to watchlist
-        item = WatchlistItem(
-            watchlist_id=watchlist.id,
-            stock_id=stock.id,
-            notes=data.get('notes'),
-            alert_price_above=data.get('alert_price_above'),
-            alert_price_below=data.get('alert_price_below')
-        )
+        if item is None:
+            db.session.rollback()
+            return jsonify({'error': 'Stock already in watchlist'}), 409
         
-        db.session.add(item)
         db.session.commit()
         
         return jsonify({
@@ -127,55 +139,61 @@ def add_to_watchlist(watchlist_id):
         }), 201
         
     except Exception as e:
-        logger.error(f"Add to watchlist error: {e}")
+        logger.error("Add to watchlist error: %s", e)
         db.session.rollback()
         return jsonify({'error': 'Failed to add stock to watchlist'}), 500
 
 
 @watchlist_bp.route('/<int:watchlist_id>/items/<int:item_id>', methods=['DELETE'])
-@jwt_required()
+@cached_jwt_required()
 def remove_from_watchlist(watchlist_id, item_id):
     """Remove a stock from watchlist."""
     try:
         user_id = get_jwt_identity()
-        watchlist = Watchlist.query.filter_by(id=watchlist_id, user_id=user_id).first()
-        
-        if not watchlist:
+        if not user_owns_watchlist(watchlist_id, user_id):
             return jsonify({'error': 'Watchlist not found'}), 404
         
-        item = WatchlistItem.query.filter_by(id=item_id, watchlist_id=watchlist.id).first()
+        result = db.session.execute(
+            delete(WatchlistItem).where(
+                WatchlistItem.id == item_id,
+                WatchlistItem.watchlist_id == watchlist_id
+            )
+        )
         
-        if not item:
+        if result.rowcount == 0:
+            db.session.rollback()
             return jsonify({'error': 'Item not found'}), 404
         
-        db.session.delete(item)
         db.session.commit()
         
         return jsonify({'message': 'Stock removed from watchlist'}), 200
         
     except Exception as e:
-        logger.error(f"Remove from watchlist error: {e}")
+        logger.error("Remove from watchlist error: %s", e)
         db.session.rollback()
         return jsonify({'error': 'Failed to remove stock'}), 500
 
 
 @watchlist_bp.route('/<int:watchlist_id>', methods=['DELETE'])
-@jwt_required()
+@cached_jwt_required()
 def delete_watchlist(watchlist_id):
     """Delete a watchlist."""
     try:
         user_id = get_jwt_identity()
-        watchlist = Watchlist.query.filter_by(id=watchlist_id, user_id=user_id).first()
+        # Single DELETE; items go with it through the ON DELETE CASCADE foreign key
+        result = db.session.execute(
+            delete(Watchlist).where(Watchlist.id == watchlist_id, Watchlist.user_id == user_id)
+        )
         
-        if not watchlist:
+        if result.rowcount == 0:
+            db.session.rollback()
             return jsonify({'error': 'Watchlist not found'}), 404
         
-        db.session.delete(watchlist)
         db.session.commit()
         
         return jsonify({'message': 'Watchlist deleted'}), 200
         
     except Exception as e:
-        logger.error(f"Delete watchlist error: {e}")
+        logger.error("Delete watchlist error: %s", e)
         db.session.rollback()
         return jsonify({'error': 'Failed to delete watchlist'}), 500
@@ -1,23 +1,88 @@
 """Main Flask application."""
+from gevent import monkey
+monkey.patch_all()
+
 import os
+import atexit
 import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener
+from decimal import Decimal
+import click
+import orjson
 from flask import Flask, jsonify
+from flask.json.provider import JSONProvider
 from flask_cors import CORS
+from flask_compress import Compress
 from flask_jwt_extended import JWTManager
 from flask_socketio import SocketIO
 from config import config
 from models import init_db
+from services import init_services
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+# Configure logging: request paths only enqueue records; a listener
+# thread formats them and does the blocking stream write
+_log_queue = queue.SimpleQueue()
+_log_handler = logging.StreamHandler()
+_log_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+_log_listener = QueueListener(_log_queue, _log_handler, respect_handler_level=True)
+_log_listener.start()
+atexit.register(_log_listener.stop)
+logging.root.addHandler(QueueHandler(_log_queue))
+logging.root.setLevel(logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Initialize extensions
 jwt = JWTManager()
 socketio = SocketIO()
+compress = Compress()
+
+# Bodies of the static info endpoints, encoded once at import
+_HEALTH_BODY = orjson.dumps({
+    'status': 'healthy',
+    'service': 'StockScope API',
+    'version': '1.0.0'
+})
+_API_INFO_BODY = orjson.dumps({
+    'name': 'StockScope API',
+    'version': '1.0.0',
+    'endpoints': {
+        'auth': '/api/auth',
+        'stocks': '/api/stocks',
+        'portfolio': '/api/portfolio',
+        'watchlist': '/api/watchlist',
+        'market': '/api/market'
+    }
+})
+
+
+def _orjson_default(obj):
+    """Serialize types orjson does not handle natively."""
+    if isinstance(obj, Decimal):
+        return float(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+class ORJSONProvider(JSONProvider):
+    """JSON provider backed by orjson."""
+    
+    option = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NAIVE_UTC | orjson.OPT_NON_STR_KEYS
+    
+    def dumps(self, obj, **kwargs):
+        """Serialize data as a JSON string."""
+        return orjson.dumps(obj, default=_orjson_default, option=self.option).decode()
+    
+    def loads(self, s, **kwargs):
+        """Deserialize data from a JSON string or bytes."""
+        return orjson.loads(s)
+    
+    def response(self, *args, **kwargs):
+        """Build a JSON response straight from orjson bytes (no str round-trip)."""
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(
+            orjson.dumps(obj, default=_orjson_default, option=self.option),
+            mimetype='application/json'
+        )
 
 
 def create_app(config_name=None):
@@ -27,18 +92,30 @@ def create_app(config_name=None):
     
     app = Flask(__name__)
     app.config.from_object(config[config_name])
+    app.json = ORJSONProvider(app)
+    
+    # Per-request info/debug records are only wanted while debugging
+    if not app.debug:
+        logging.getLogger('api').setLevel(logging.WARNING)
+        logging.getLogger('services').setLevel(logging.WARNING)
     
     # Initialize extensions
     CORS(app, origins=app.config['CORS_ORIGINS'], supports_credentials=True)
     jwt.init_app(app)
+    compress.init_app(app)
     init_db(app)
+    init_services(app)
     socketio.init_app(
         app,
-        cors_allowed_origins=app.config['CORS_ORIGINS'],
+        cors_allowed_origins=app.config['CORS_ORIGINS_SET'],
         message_queue=app.config.get('SOCKETIO_MESSAGE_QUEUE'),
-        async_mode=app.config.get('SOCKETIO_ASYNC_MODE', 'eventlet')
+        async_mode=app.config.get('SOCKETIO_ASYNC_MODE', 'gevent')
     )
     
+    # URL converters must be registered before blueprint routes are added
+    from api.utils import SymbolConverter
+    app.url_map.converters['sym'] = SymbolConverter
+    
     # Register blueprints
     from api.auth import auth_bp
     from api.stocks import stocks_bp
@@ -71,44 +148,54 @@ def create_app(config_name=None):
     
     @jwt.unauthorized_loader
     def missing_token_callback(error):
-        logger.error(f"Missing token: {error}")
+        logger.error("Missing token: %s", error)
         return jsonify({'error': 'Authorization required - no token found in cookies'}), 401
     
     @jwt.invalid_token_loader
     def invalid_token_callback(error):
-        logger.error(f"Invalid token: {error}")
+        logger.error("Invalid token: %s", error)
         return jsonify({'error': 'Invalid token'}), 401
     
     @jwt.expired_token_loader
     def expired_token_callback(jwt_header, jwt_payload):
-        logger.error(f"Token expired: {jwt_payload}")
+        logger.error("Token expired: %s", jwt_payload)
         return jsonify({'error': 'Token has expired'}), 401
     
+    @app.cli.command('warm-quotes')
+    @click.argument('symbols', nargs=-1)
+    def warm_quotes_command(symbols):
+        """Prime the quote cache (defaults to all active stocks)."""
+        if not symbols:
+            from sqlalchemy import select
+            from models import db
+            from models.stock import Stock
+            symbols = db.session.scalars(select(Stock.symbol).where(Stock.is_active)).all()
+        
+        warmed = app.extensions['stock_service'].warm_quotes([s.upper() for s in symbols])
+        click.echo(f"Warmed {warmed}/{len(symbols)} quotes")
+    
+    @app.cli.command('warm-market')
+    @click.option('--limit', 'limits', type=int, multiple=True, default=[10],
+                  help='Movers list size to refresh (repeatable)')
+    def warm_market_command(limits):
+        """Rebuild the market indices/movers caches (run from cron, e.g. every minute)."""
+        from api.market import refresh_market_caches
+        written = refresh_market_caches(
+            app.extensions['stock_service'], app.extensions['cache_service'], limits
+        )
+        click.echo(f"Refreshed {written} market cache entries")
+    
     # Health check endpoint
     @app.route('/health')
     def health_check():
-        return jsonify({
-            'status': 'healthy',
-            'service': 'StockScope API',
-            'version': '1.0.0'
-        }), 200
+        return app.response_class(_HEALTH_BODY, status=200, mimetype='application/json')
     
     # API info endpoint
     @app.route('/api')
     def api_info():
-        return jsonify({
-            'name': 'StockScope API',
-            'version': '1.0.0',
-            'endpoints': {
-                'auth': '/api/auth',
-                'stocks': '/api/stocks',
-                'portfolio': '/api/portfolio',
-                'watchlist': '/api/watchlist',
-                'market': '/api/market'
-            }
-        }), 200
-    
-    logger.info(f"Application created with config: {config_name}")
+        return app.response_class(_API_INFO_BODY, status=200, mimetype='application/json')
+    
+    logger.info("Application created with config: %s", config_name)
     
     return app
 
@@ -1,10 +1,27 @@
 """Database models initialization."""
+import orjson
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 
-db = SQLAlchemy()
+
+def _json_serializer(value):
+    """Encode JSON column values with orjson (the driver expects str)."""
+    return orjson.dumps(value).decode()
+
+
+# JSON/JSONB columns are encoded and decoded with orjson instead of the stdlib
+db = SQLAlchemy(engine_options={
+    'json_serializer': _json_serializer,
+    'json_deserializer': orjson.loads
+})
 migrate = Migrate()
 
+# Fixed-point column types for money and share quantities. Values are stored
+# exactly (so SUMs in SQL do not accumulate binary rounding error) and read
+# back as float, which is what the JSON responses carry.
+Money = db.Numeric(18, 4, asdecimal=False)
+Quantity = db.Numeric(18, 6, asdecimal=False)
+
 
 def init_db(app):
     """Initialize database with app."""
@@ -1,6 +1,64 @@
 """Portfolio models for tracking user investments."""
 from datetime import datetime
-from models import db
+from sqlalchemy import case, func, select, text
+from sqlalchemy.ext.hybrid import hybrid_property
+from models import db, Money, Quantity
+from models.stock import Stock
+
+# Unbound method hoisted once for the per-row serializers below
+_ISO = datetime.isoformat
+
+
+# Renders one page of a portfolio's transactions, in the same shape as
+# Transaction.to_dict(), as a ready-to-send JSON document.
+TRANSACTION_PAGE_JSON_SQL = text("""
+    WITH page AS (
+        SELECT t.id, t.portfolio_id, t.transaction_type, t.quantity, t.price,
+               t.fees, t.notes, t.transaction_date, t.created_at,
+               s.id AS stock_id, s.symbol, s.name, s.exchange, s.market,
+               s.sector, s.industry, s.market_cap, s.currency
+        FROM transactions t
+        LEFT JOIN stocks s ON s.id = t.stock_id
+        WHERE t.portfolio_id = :portfolio_id
+        ORDER BY t.transaction_date DESC
+        LIMIT :limit OFFSET :offset
+    ), total AS (
+        SELECT COUNT(*) AS n FROM transactions WHERE portfolio_id = :portfolio_id
+    )
+    SELECT json_build_object(
+        'transactions', COALESCE((
+            SELECT json_agg(json_build_object(
+                'id', p.id,
+                'portfolio_id', p.portfolio_id,
+                'stock', CASE WHEN p.stock_id IS NULL THEN NULL ELSE json_build_object(
+                    'id', p.stock_id,
+                    'symbol', p.symbol,
+                    'name', p.name,
+                    'exchange', p.exchange,
+                    'market', p.market,
+                    'sector', p.sector,
+                    'industry', p.industry,
+                    'market_cap', p.market_cap,
+                    'currency', p.currency
+                ) END,
+                'transaction_type', p.transaction_type,
+                'quantity', p.quantity,
+                'price', p.price,
+                'fees', p.fees,
+                'total_amount', ROUND((p.quantity * p.price + COALESCE(p.fees, 0))::numeric, 2),
+                'notes', p.notes,
+                'transaction_date', p.transaction_date,
+                'created_at', p.created_at
+            ) ORDER BY p.transaction_date DESC)
+            FROM page p
+        ), '[]'::json),
+        'total', total.n,
+        'page', :page,
+        'per_page', :per_page,
+        'pages', CEIL(total.n::numeric / :per_page)::int
+    )::text
+    FROM total
+""")
 
 
 class Portfolio(db.Model):
@@ -9,25 +67,30 @@ class Portfolio(db.Model):
     __tablename__ = 'portfolios'
     
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False, index=True)
     name = db.Column(db.String(100), nullable=False)
     description = db.Column(db.Text)
     is_default = db.Column(db.Boolean, default=False, nullable=False)
     currency = db.Column(db.String(10), default='USD')
-    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+    item_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # Maintained by a DB trigger
+    created_at = db.Column(db.DateTime(timezone=True), server_default=db.func.now(), nullable=False)
+    updated_at = db.Column(db.DateTime(timezone=True), server_default=db.func.now(), onupdate=db.func.now(), nullable=False)
     
     # Relationships
     user = db.relationship('User', back_populates='portfolios')
-    positions = db.relationship('Position', back_populates='portfolio', lazy='dynamic', cascade='all, delete-orphan')
-    transactions = db.relationship('Transaction', back_populates='portfolio', lazy='dynamic', cascade='all, delete-orphan')
+    positions = db.relationship('Position', back_populates='portfolio', lazy='select', cascade='all, delete-orphan', passive_deletes=True)
+    transactions = db.relationship('Transaction', back_populates='portfolio', lazy='dynamic', cascade='all, delete-orphan', passive_deletes=True)
     
     def __repr__(self):
         """String representation."""
         return f'<Portfolio {self.name}>'
     
-    def to_dict(self, include_positions=False, include_stats=False):
-        """Convert to dictionary."""
+    def to_dict(self, include_positions=False, include_stats=False, stats=None):
+        """Convert to dictionary.
+        
+        ``stats`` may be passed in when it was precomputed in bulk
+        (see ``compute_stats_bulk``) to avoid a per-portfolio query.
+        """
         data = {
             'id': self.id,
             'user_id': self.user_id,
@@ -35,33 +98,24 @@ class Portfolio(db.Model):
             'description': self.description,
             'is_default': self.is_default,
             'currency': self.currency,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+            'item_count': self.item_count,
+            'created_at': _ISO(self.created_at) if self.created_at else None,
+            'updated_at': _ISO(self.updated_at) if self.updated_at else None
         }
         
         if include_positions:
-            data['positions'] = [pos.to_dict() for pos in self.positions.all()]
+            data['positions'] = [pos.to_dict() for pos in self.positions]
         
         if include_stats:
-            data['stats'] = self.calculate_stats()
+            data['stats'] = stats if stats is not None else self.calculate_stats()
         
         return data
     
-    def calculate_stats(self):
-        """Calculate portfolio statistics."""
-        positions = self.positions.all()
-        
-        if not positions:
-            return {
-                'total_value': 0,
-                'total_cost': 0,
-                'total_gain_loss': 0,
-                'total_gain_loss_percent': 0,
-                'position_count': 0
-            }
-        
-        total_value = sum(pos.current_value or 0 for pos in positions)
-        total_cost = sum(pos.total_cost or 0 for pos in positions)
+    @staticmethod
+    def _build_stats(total_value, total_cost, position_count):
+        """Build the stats dictionary from aggregated totals."""
+        total_value = total_value or 0
+        total_cost = total_cost or 0
         total_gain_loss = total_value - total_cost
         total_gain_loss_percent = (total_gain_loss / total_cost * 100) if total_cost > 0 else 0
         
@@ -70,8 +124,47 @@ class Portfolio(db.Model):
             'total_cost': round(total_cost, 2),
             'total_gain_loss': round(total_gain_loss, 2),
             'total_gain_loss_percent': round(total_gain_loss_percent, 2),
-            'position_count': len(positions)
+            'position_count': position_count
         }
+    
+    @classmethod
+    def compute_stats_bulk(cls, portfolio_ids):
+        """
+        Calculate statistics for several portfolios with a single query.
+        
+        Args:
+            portfolio_ids: Portfolio ids to aggregate
+            
+        Returns:
+            Dictionary mapping portfolio id to its stats dictionary
+        """
+        if not portfolio_ids:
+            return {}
+        
+        rows = db.session.query(
+            Position.portfolio_id,
+            func.sum(Position.quantity * Stock.last_price),
+            func.sum(Position.total_cost),
+            func.count(Position.id)
+        ).outerjoin(
+            Stock, Stock.id == Position.stock_id
+        ).filter(
+            Position.portfolio_id.in_(portfolio_ids)
+        ).group_by(Position.portfolio_id).all()
+        
+        stats = {
+            portfolio_id: cls._build_stats(total_value, total_cost, count)
+            for portfolio_id, total_value, total_cost, count in rows
+        }
+        
+        return {
+            portfolio_id: stats.get(portfolio_id) or cls._build_stats(0, 0, 0)
+            for portfolio_id in portfolio_ids
+        }
+    
+    def calculate_stats(self):
+        """Calculate portfolio statistics."""
+        return self.compute_stats_bulk([self.id])[self.id]
 
 
 class Position(db.Model):
@@ -80,12 +173,13 @@ class Position(db.Model):
     __tablename__ = 'portfolio_positions'  # Changed from 'positions' to match actual database
     
     id = db.Column(db.Integer, primary_key=True)
-    portfolio_id = db.Column(db.Integer, db.ForeignKey('portfolios.id'), nullable=False, index=True)
+    # Indexed through the leading column of uq_portfolio_stock
+    portfolio_id = db.Column(db.Integer, db.ForeignKey('portfolios.id', ondelete='CASCADE'), nullable=False)
     stock_id = db.Column(db.Integer, db.ForeignKey('stocks.id'), nullable=False, index=True)
-    quantity = db.Column(db.Float, nullable=False, default=0)
-    average_price = db.Column(db.Float, nullable=False, default=0)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+    quantity = db.Column(Quantity, nullable=False, default=0)
+    average_price = db.Column(Money, nullable=False, default=0)
+    created_at = db.Column(db.DateTime(timezone=True), server_default=db.func.now(), nullable=False)
+    updated_at = db.Column(db.DateTime(timezone=True), server_default=db.func.now(), onupdate=db.func.now(), nullable=False)
     
     # Relationships
     portfolio = db.relationship('Portfolio', back_populates='positions')
@@ -96,50 +190,80 @@ class Position(db.Model):
         db.UniqueConstraint('portfolio_id', 'stock_id', name='uq_portfolio_stock'),
     )
     
-    @property
+    # The hybrids below also work as SQL expressions, so positions can be
+    # filtered and sorted by value or gain in the database, e.g.
+    # select(Position).order_by(Position.gain_loss.desc())
+    
+    @hybrid_property
     def total_cost(self):
         """Calculate total cost basis."""
         return self.quantity * self.average_price
     
-    @property
+    @hybrid_property
     def current_value(self):
         """Calculate current market value."""
         if self.stock and self.stock.last_price:
             return self.quantity * self.stock.last_price
         return None
     
-    @property
+    @current_value.expression
+    def current_value(cls):
+        """Market value from the stock's last price (NULL when unknown)."""
+        last_price = select(Stock.last_price).where(Stock.id == cls.stock_id).scalar_subquery()
+        return cls.quantity * last_price
+    
+    @hybrid_property
     def gain_loss(self):
         """Calculate gain/loss."""
         if self.current_value is not None:
             return self.current_value - self.total_cost
         return None
     
-    @property
+    @gain_loss.expression
+    def gain_loss(cls):
+        """Gain/loss against cost basis (NULL when the price is unknown)."""
+        return cls.current_value - cls.total_cost
+    
+    @hybrid_property
     def gain_loss_percent(self):
         """Calculate gain/loss percentage."""
         if self.gain_loss is not None and self.total_cost > 0:
             return (self.gain_loss / self.total_cost) * 100
         return None
     
+    @gain_loss_percent.expression
+    def gain_loss_percent(cls):
+        """Gain/loss percentage (NULL when there is no cost basis)."""
+        return case((cls.total_cost > 0, cls.gain_loss / cls.total_cost * 100), else_=None)
+    
     def __repr__(self):
         """String representation."""
         return f'<Position {self.stock.symbol} qty={self.quantity}>'
     
     def to_dict(self):
         """Convert to dictionary."""
+        # Derive every figure once from locals instead of going through the
+        # chained properties, which re-walk self.stock on each access
+        quantity = self.quantity
+        total_cost = quantity * self.average_price
+        stock = self.stock
+        last_price = stock.last_price if stock else None
+        current_value = quantity * last_price if last_price is not None else None
+        gain_loss = current_value - total_cost if current_value is not None else None
+        gain_loss_percent = (gain_loss / total_cost) * 100 if gain_loss is not None and total_cost > 0 else None
+        
         return {
             'id': self.id,
             'portfolio_id': self.portfolio_id,
-            'stock': self.stock.to_dict() if self.stock else None,
-            'quantity': self.quantity,
+            'stock': stock.to_dict() if stock else None,
+            'quantity': quantity,
             'average_price': self.average_price,
-            'total_cost': round(self.total_cost, 2),
-            'current_value': round(self.current_value, 2) if self.current_value else None,
-            'gain_loss': round(self.gain_loss, 2) if self.gain_loss else None,
-            'gain_loss_percent': round(self.gain_loss_percent, 2) if self.gain_loss_percent else None,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+            'total_cost': round(total_cost, 2),
+            'current_value': round(current_value, 2) if current_value is not None else None,
+            'gain_loss': round(gain_loss, 2) if gain_loss is not None else None,
+            'gain_loss_percent': round(gain_loss_percent, 2) if gain_loss_percent is not None else None,
+            'created_at': _ISO(self.created_at) if self.created_at else None,
+            'updated_at': _ISO(self.updated_at) if self.updated_at else None
         }
 
 
@@ -149,20 +273,30 @@ class Transaction(db.Model):
     __tablename__ = 'transactions'
     
     id = db.Column(db.Integer, primary_key=True)
-    portfolio_id = db.Column(db.Integer, db.ForeignKey('portfolios.id'), nullable=False, index=True)
+    # Indexed through the leading column of ix_transactions_pid_date
+    portfolio_id = db.Column(db.Integer, db.ForeignKey('portfolios.id', ondelete='CASCADE'), nullable=False)
     stock_id = db.Column(db.Integer, db.ForeignKey('stocks.id'), nullable=False, index=True)
     transaction_type = db.Column(db.String(10), nullable=False)  # BUY, SELL
-    quantity = db.Column(db.Float, nullable=False)
-    price = db.Column(db.Float, nullable=False)
-    fees = db.Column(db.Float, default=0)
+    quantity = db.Column(Quantity, nullable=False)
+    price = db.Column(Money, nullable=False)
+    fees = db.Column(Money, default=0)
     notes = db.Column(db.Text)
     transaction_date = db.Column(db.DateTime, nullable=False, index=True)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    created_at = db.Column(db.DateTime(timezone=True), server_default=db.func.now(), nullable=False)
     
     # Relationships
     portfolio = db.relationship('Portfolio', back_populates='transactions')
     stock = db.relationship('Stock')
     
+    # Newest-first history per portfolio without a sort step
+    __table_args__ = (
+        db.Index(
+            'ix_transactions_pid_date',
+            'portfolio_id', db.text('transaction_date DESC'),
+            postgresql_include=['stock_id', 'quantity', 'price']
+        ),
+    )
+    
     @property
     def total_amount(self):
         """Calculate total transaction amount including fees."""
@@ -172,6 +306,27 @@ class Transaction(db.Model):
         """String representation."""
         return f'<Transaction {self.transaction_type} {self.stock.symbol} qty={self.quantity}>'
     
+    @staticmethod
+    def page_json(portfolio_id, page, per_page):
+        """
+        Render a page of a portfolio's transactions as JSON inside PostgreSQL.
+        
+        Args:
+            portfolio_id: Portfolio to read transactions for
+            page: 1-based page number
+            per_page: Page size
+            
+        Returns:
+            JSON document string with transactions and pagination fields
+        """
+        return db.session.execute(TRANSACTION_PAGE_JSON_SQL, {
+            'portfolio_id': portfolio_id,
+            'limit': per_page,
+            'offset': (page - 1) * per_page,
+            'page': page,
+            'per_page': per_page
+        }).scalar_one()
+    
     def to_dict(self):
         """Convert to dictionary."""
         return {
@@ -184,6 +339,6 @@ class Transaction(db.Model):
             'fees': self.fees,
             'total_amount': round(self.total_amount, 2),
             'notes': self.notes,
-            'transaction_date': self.transaction_date.isoformat() if self.transaction_date else None,
-            'created_at': self.created_at.isoformat() if self.created_at else None
+            'transaction_date': _ISO(self.transaction_date) if self.transaction_date else None,
+            'created_at': _ISO(self.created_at) if self.created_at else None
         }
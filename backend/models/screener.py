@@ -1,7 +1,7 @@
 """Screener models for custom stock screening."""
 from datetime import datetime
+from sqlalchemy.dialects.postgresql import JSONB
 from models import db
-import json
 
 
 class SavedScreener(db.Model):
@@ -10,13 +10,13 @@ class SavedScreener(db.Model):
     __tablename__ = 'saved_screeners'
     
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False, index=True)
     name = db.Column(db.String(100), nullable=False)
     description = db.Column(db.Text)
-    filters = db.Column(db.JSON, nullable=False)  # JSON array of filter criteria
+    filters = db.Column(db.JSON().with_variant(JSONB, 'postgresql'), nullable=False)  # JSON array of filter criteria
     is_public = db.Column(db.Boolean, default=False, nullable=False)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+    created_at = db.Column(db.DateTime(timezone=True), server_default=db.func.now(), nullable=False)
+    updated_at = db.Column(db.DateTime(timezone=True), server_default=db.func.now(), onupdate=db.func.now(), nullable=False)
     last_run_at = db.Column(db.DateTime)
     
     # Relationships
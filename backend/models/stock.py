@@ -1,6 +1,44 @@
 """Stock-related models for market data."""
-from datetime import datetime
-from models import db
+from datetime import date, datetime
+from functools import lru_cache
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from models import db, Money
+
+# Unbound method hoisted once for the per-row serializers below
+_ISO = datetime.isoformat
+
+# date ordinal -> ISO string; bounded by the number of distinct trading days
+_DATE_ISO = {}
+
+
+def _date_iso(value):
+    """ISO string for a date, built once per distinct date."""
+    ordinal = value.toordinal()
+    iso = _DATE_ISO.get(ordinal)
+    if iso is None:
+        iso = _DATE_ISO[ordinal] = value.isoformat()
+    return iso
+
+
+@lru_cache(maxsize=200_000)
+def _price_row_dict(row_id, date_ordinal, open_, high, low, close, adj_close, volume):
+    """
+    Serialized form of an end-of-day price row.
+    
+    Price rows are not edited after insert, and every value is part of the
+    key, so a changed row simply misses. The returned dict is shared between
+    callers and must not be mutated.
+    """
+    return {
+        'date': date.fromordinal(date_ordinal).isoformat(),
+        'open': open_,
+        'high': high,
+        'low': low,
+        'close': close,
+        'adj_close': adj_close,
+        'volume': volume
+    }
 
 
 class Stock(db.Model):
@@ -20,19 +58,27 @@ class Stock(db.Model):
     currency = db.Column(db.String(10), default='USD')
     is_active = db.Column(db.Boolean, default=True, nullable=False)
     ipo_date = db.Column(db.Date)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+    created_at = db.Column(db.DateTime(timezone=True), server_default=db.func.now(), nullable=False)
+    updated_at = db.Column(db.DateTime(timezone=True), server_default=db.func.now(), onupdate=db.func.now(), nullable=False)
     
     # Latest quote cache
-    last_price = db.Column(db.Float)
-    price_change = db.Column(db.Float)
+    last_price = db.Column(Money)
+    price_change = db.Column(Money)
     price_change_percent = db.Column(db.Float)
     volume = db.Column(db.BigInteger)
     quote_updated_at = db.Column(db.DateTime)
     
     # Relationships
-    price_data = db.relationship('StockPriceData', back_populates='stock', lazy='dynamic', cascade='all, delete-orphan')
-    technical_indicators = db.relationship('TechnicalIndicator', back_populates='stock', lazy='dynamic', cascade='all, delete-orphan')
+    price_data = db.relationship('StockPriceData', back_populates='stock', lazy='dynamic', cascade='all, delete-orphan', passive_deletes=True)
+    technical_indicators = db.relationship('TechnicalIndicator', back_populates='stock', lazy='dynamic', cascade='all, delete-orphan', passive_deletes=True)
+    
+    # Stock listings only ever read active stocks
+    __table_args__ = (
+        db.Index(
+            'ix_stocks_active_market_exchange', 'market', 'exchange',
+            postgresql_where=db.text('is_active')
+        ),
+    )
     
     def __repr__(self):
         """String representation."""
@@ -40,25 +86,45 @@ class Stock(db.Model):
     
     def to_dict(self, include_quote=True):
         """Convert to dictionary."""
+        return Stock.serialize(self, include_quote)
+    
+    @classmethod
+    def list_columns(cls):
+        """Columns needed by ``serialize`` when selecting rows without the ORM."""
+        return (
+            cls.id, cls.symbol, cls.name, cls.exchange, cls.market, cls.sector,
+            cls.industry, cls.market_cap, cls.currency, cls.last_price,
+            cls.price_change, cls.price_change_percent, cls.volume, cls.quote_updated_at
+        )
+    
+    @staticmethod
+    def serialize(source, include_quote=True):
+        """
+        Convert a stock instance or a row selected with ``list_columns`` to a dictionary.
+        
+        Args:
+            source: Stock instance or Core result row
+            include_quote: Whether to include the latest quote block
+        """
         data = {
-            'id': self.id,
-            'symbol': self.symbol,
-            'name': self.name,
-            'exchange': self.exchange,
-            'market': self.market,
-            'sector': self.sector,
-            'industry': self.industry,
-            'market_cap': self.market_cap,
-            'currency': self.currency
+            'id': source.id,
+            'symbol': source.symbol,
+            'name': source.name,
+            'exchange': source.exchange,
+            'market': source.market,
+            'sector': source.sector,
+            'industry': source.industry,
+            'market_cap': source.market_cap,
+            'currency': source.currency
         }
         
-        if include_quote and self.last_price:
+        if include_quote and source.last_price:
             data['quote'] = {
-                'price': self.last_price,
-                'change': self.price_change,
-                'change_percent': self.price_change_percent,
-                'volume': self.volume,
-                'updated_at': self.quote_updated_at.isoformat() if self.quote_updated_at else None
+                'price': source.last_price,
+                'change': source.price_change,
+                'change_percent': source.price_change_percent,
+                'volume': source.volume,
+                'updated_at': _ISO(source.quote_updated_at) if source.quote_updated_at else None
             }
         
         return data
@@ -70,15 +136,15 @@ class StockPriceData(db.Model):
     __tablename__ = 'stock_price_data'
     
     id = db.Column(db.Integer, primary_key=True)
-    stock_id = db.Column(db.Integer, db.ForeignKey('stocks.id'), nullable=False, index=True)
+    stock_id = db.Column(db.Integer, db.ForeignKey('stocks.id', ondelete='CASCADE'), nullable=False, index=True)
     date = db.Column(db.Date, nullable=False, index=True)
-    open = db.Column(db.Float, nullable=False)
-    high = db.Column(db.Float, nullable=False)
-    low = db.Column(db.Float, nullable=False)
-    close = db.Column(db.Float, nullable=False)
-    adj_close = db.Column(db.Float)
+    open = db.Column(Money, nullable=False)
+    high = db.Column(Money, nullable=False)
+    low = db.Column(Money, nullable=False)
+    close = db.Column(Money, nullable=False)
+    adj_close = db.Column(Money)
     volume = db.Column(db.BigInteger, nullable=False)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    created_at = db.Column(db.DateTime(timezone=True), server_default=db.func.now(), nullable=False)
     
     # Relationships
     stock = db.relationship('Stock', back_populates='price_data')
@@ -93,26 +159,90 @@ class StockPriceData(db.Model):
         """String representation."""
         return f'<StockPriceData {self.stock.symbol} {self.date}>'
     
+    @classmethod
+    def bulk_history(cls, stock_id, start=None, end=None):
+        """
+        Load a date range of prices as plain dictionaries, oldest first.
+        
+        Selects the ``to_dict`` columns with a Core query, so no ORM objects
+        are built; dates stay ``date`` objects, which the orjson-backed JSON
+        provider encodes as ISO strings directly.
+        
+        Args:
+            stock_id: Stock id
+            start: Optional first date (inclusive)
+            end: Optional last date (inclusive)
+        """
+        stmt = select(
+            cls.date, cls.open, cls.high, cls.low, cls.close, cls.adj_close, cls.volume
+        ).where(cls.stock_id == stock_id)
+        
+        if start is not None:
+            stmt = stmt.where(cls.date >= start)
+        if end is not None:
+            stmt = stmt.where(cls.date <= end)
+        
+        return [dict(row._mapping) for row in db.session.execute(stmt.order_by(cls.date))]
+    
+    @classmethod
+    def bulk_upsert(cls, rows, batch_size=1000):
+        """
+        Insert or update many price rows with multi-row INSERT ... ON CONFLICT.
+        
+        Bypasses the ORM unit of work (no instances, no per-row flush); rows
+        already stored for a (stock_id, date) are overwritten with the new
+        prices. The caller commits.
+        
+        Args:
+            rows: Dictionaries with stock_id, date, open, high, low, close,
+                adj_close and volume; at most one per (stock_id, date)
+            batch_size: Rows per statement, keeping bind parameters well
+                under PostgreSQL's limit
+            
+        Returns:
+            Number of rows written
+        """
+        written = 0
+        
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start:start + batch_size]
+            stmt = pg_insert(cls).values(batch)
+            excluded = stmt.excluded
+            stmt = stmt.on_conflict_do_update(
+                index_elements=['stock_id', 'date'],
+                set_={
+                    'open': excluded.open,
+                    'high': excluded.high,
+                    'low': excluded.low,
+                    'close': excluded.close,
+                    'adj_close': excluded.adj_close,
+                    'volume': excluded.volume
+                }
+            )
+            db.session.execute(stmt)
+            written += len(batch)
+        
+        return written
+    
     def to_dict(self):
         """Convert to dictionary."""
-        return {
-            'date': self.date.isoformat(),
-            'open': self.open,
-            'high': self.high,
-            'low': self.low,
-            'close': self.close,
-            'adj_close': self.adj_close,
-            'volume': self.volume
-        }
+        return _price_row_dict(
+            self.id, self.date.toordinal(), self.open, self.high, self.low,
+            self.close, self.adj_close, self.volume
+        )
 
 
 class TechnicalIndicator(db.Model):
-    """Technical indicators for stocks."""
+    """
+    Technical indicators for stocks, one wide row per stock and date.
+    
+    For reading a few indicators over a range prefer ``TechnicalIndicatorValue``.
+    """
     
     __tablename__ = 'technical_indicators'
     
     id = db.Column(db.Integer, primary_key=True)
-    stock_id = db.Column(db.Integer, db.ForeignKey('stocks.id'), nullable=False, index=True)
+    stock_id = db.Column(db.Integer, db.ForeignKey('stocks.id', ondelete='CASCADE'), nullable=False, index=True)
     date = db.Column(db.Date, nullable=False, index=True)
     
     # Moving Averages
@@ -139,8 +269,8 @@ class TechnicalIndicator(db.Model):
     atr_14 = db.Column(db.Float)  # Average True Range
     adx_14 = db.Column(db.Float)  # Average Directional Index
     
-    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+    created_at = db.Column(db.DateTime(timezone=True), server_default=db.func.now(), nullable=False)
+    updated_at = db.Column(db.DateTime(timezone=True), server_default=db.func.now(), onupdate=db.func.now(), nullable=False)
     
     # Relationships
     stock = db.relationship('Stock', back_populates='technical_indicators')
@@ -155,10 +285,41 @@ class TechnicalIndicator(db.Model):
         """String representation."""
         return f'<TechnicalIndicator {self.stock.symbol} {self.date}>'
     
+    @classmethod
+    def value_columns(cls):
+        """Columns serialized by ``to_dict``, in output order."""
+        return (
+            cls.date, cls.sma_20, cls.sma_50, cls.sma_200, cls.ema_12, cls.ema_26,
+            cls.rsi_14, cls.macd, cls.macd_signal, cls.macd_histogram,
+            cls.bb_upper, cls.bb_middle, cls.bb_lower, cls.atr_14, cls.adx_14
+        )
+    
+    @classmethod
+    def bulk_history(cls, stock_id, start=None, end=None):
+        """
+        Load a date range of indicator values as plain dictionaries, oldest first.
+        
+        Same shape as ``to_dict`` (with ``date`` left as a ``date``), built
+        from a Core query without instantiating ORM objects.
+        
+        Args:
+            stock_id: Stock id
+            start: Optional first date (inclusive)
+            end: Optional last date (inclusive)
+        """
+        stmt = select(*cls.value_columns()).where(cls.stock_id == stock_id)
+        
+        if start is not None:
+            stmt = stmt.where(cls.date >= start)
+        if end is not None:
+            stmt = stmt.where(cls.date <= end)
+        
+        return [dict(row._mapping) for row in db.session.execute(stmt.order_by(cls.date))]
+    
     def to_dict(self):
         """Convert to dictionary."""
         return {
-            'date': self.date.isoformat(),
+            'date': _date_iso(self.date),
             'sma_20': self.sma_20,
             'sma_50': self.sma_50,
             'sma_200': self.sma_200,
@@ -174,3 +335,53 @@ class TechnicalIndicator(db.Model):
             'atr_14': self.atr_14,
             'adx_14': self.adx_14
         }
+
+
+class TechnicalIndicatorValue(db.Model):
+    """
+    One indicator value for a stock on a date (long format).
+    
+    Reads that need one or two indicators over a date range touch only those
+    rows, through the primary key, instead of every column of the wide
+    ``technical_indicators`` row.
+    """
+    
+    __tablename__ = 'technical_indicator_values'
+    
+    stock_id = db.Column(db.Integer, db.ForeignKey('stocks.id', ondelete='CASCADE'), primary_key=True)
+    name = db.Column(db.String(20), primary_key=True)  # e.g. sma_20, rsi_14
+    date = db.Column(db.Date, primary_key=True)
+    value = db.Column(db.Float, nullable=False)
+    
+    def __repr__(self):
+        """String representation."""
+        return f'<TechnicalIndicatorValue {self.stock_id} {self.name} {self.date}>'
+    
+    @classmethod
+    def series(cls, stock_id, names, start=None, end=None):
+        """
+        Load date-ordered series for the requested indicators.
+        
+        Args:
+            stock_id: Stock id
+            names: Indicator names, e.g. ('sma_20', 'rsi_14')
+            start: Optional first date (inclusive)
+            end: Optional last date (inclusive)
+            
+        Returns:
+            Dictionary mapping each name to a list of {'date', 'value'} points
+        """
+        stmt = select(cls.name, cls.date, cls.value).where(
+            cls.stock_id == stock_id, cls.name.in_(names)
+        )
+        
+        if start is not None:
+            stmt = stmt.where(cls.date >= start)
+        if end is not None:
+            stmt = stmt.where(cls.date <= end)
+        
+        series = {name: [] for name in names}
+        for name, day, value in db.session.execute(stmt.order_by(cls.name, cls.date)):
+            series[name].append({'date': _date_iso(day), 'value': value})
+        
+        return series
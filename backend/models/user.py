@@ -1,8 +1,27 @@
 """User model for authentication and user management."""
 from datetime import datetime
-from werkzeug.security import generate_password_hash, check_password_hash
+from argon2 import PasswordHasher
+from argon2.exceptions import VerificationError, InvalidHashError
+from gevent import get_hub
+from werkzeug.security import check_password_hash
 from models import db
 
+# argon2id at the OWASP baseline cost (19 MiB, 2 passes)
+_password_hasher = PasswordHasher(time_cost=2, memory_cost=19 * 1024, parallelism=1)
+
+
+def _off_loop(func, *args):
+    """Run CPU-heavy hashing in gevent's native thread pool so other greenlets keep running."""
+    return get_hub().threadpool.apply(func, args)
+
+
+def _verify_argon2(password_hash, password):
+    """Verify an argon2 hash, returning False instead of raising on mismatch."""
+    try:
+        return _password_hasher.verify(password_hash, password)
+    except (VerificationError, InvalidHashError):
+        return False
+
 
 class User(db.Model):
     """User model for authentication."""
@@ -19,8 +38,8 @@ class User(db.Model):
     # is_admin and email_verified removed as they are missing in Supabase schema
     # is_admin = db.Column(db.Boolean, default=False, nullable=False)
     # email_verified = db.Column(db.Boolean, default=False, nullable=False)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+    created_at = db.Column(db.DateTime(timezone=True), server_default=db.func.now(), nullable=False)
+    updated_at = db.Column(db.DateTime(timezone=True), server_default=db.func.now(), onupdate=db.func.now(), nullable=False)
     last_login_at = db.Column(db.DateTime)
     
     # Preferences
@@ -28,9 +47,9 @@ class User(db.Model):
     theme = db.Column(db.String(10), default='dark')  # dark, light
     
     # Relationships
-    watchlists = db.relationship('Watchlist', back_populates='user', lazy='dynamic', cascade='all, delete-orphan')
-    portfolios = db.relationship('Portfolio', back_populates='user', lazy='dynamic', cascade='all, delete-orphan')
-    saved_screeners = db.relationship('SavedScreener', back_populates='user', lazy='dynamic', cascade='all, delete-orphan')
+    watchlists = db.relationship('Watchlist', back_populates='user', lazy='select', cascade='all, delete-orphan', passive_deletes=True)
+    portfolios = db.relationship('Portfolio', back_populates='user', lazy='select', cascade='all, delete-orphan', passive_deletes=True)
+    saved_screeners = db.relationship('SavedScreener', back_populates='user', lazy='select', cascade='all, delete-orphan', passive_deletes=True)
     
     def __repr__(self):
         """String representation."""
@@ -38,11 +57,28 @@ class User(db.Model):
     
     def set_password(self, password):
         """Hash and set password."""
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = _off_loop(_password_hasher.hash, password)
     
     def check_password(self, password):
-        """Check password against hash."""
-        return check_password_hash(self.password_hash, password)
+        """
+        Check password against hash.
+        
+        Hashes created before the switch to argon2 (werkzeug pbkdf2/scrypt)
+        are still accepted and replaced with an argon2 hash on success; the
+        caller's next commit persists it.
+        """
+        if not self.password_hash.startswith('$argon2'):
+            if not _off_loop(check_password_hash, self.password_hash, password):
+                return False
+            self.set_password(password)
+            return True
+        
+        if not _off_loop(_verify_argon2, self.password_hash, password):
+            return False
+        
+        if _password_hasher.check_needs_rehash(self.password_hash):
+            self.set_password(password)
+        return True
     
     def to_dict(self, include_email=False):
         """Convert to dictionary."""
@@ -2,6 +2,9 @@
 from datetime import datetime
 from models import db
 
+# Unbound method hoisted once for the per-row serializers below
+_ISO = datetime.isoformat
+
 
 class Watchlist(db.Model):
     """User watchlist."""
@@ -9,16 +12,17 @@ class Watchlist(db.Model):
     __tablename__ = 'watchlists'
     
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False, index=True)
     name = db.Column(db.String(100), nullable=False)
     description = db.Column(db.Text)
     is_default = db.Column(db.Boolean, default=False, nullable=False)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+    item_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # Maintained by a DB trigger
+    created_at = db.Column(db.DateTime(timezone=True), server_default=db.func.now(), nullable=False)
+    updated_at = db.Column(db.DateTime(timezone=True), server_default=db.func.now(), onupdate=db.func.now(), nullable=False)
     
     # Relationships
     user = db.relationship('User', back_populates='watchlists')
-    items = db.relationship('WatchlistItem', back_populates='watchlist', lazy='dynamic', cascade='all, delete-orphan')
+    items = db.relationship('WatchlistItem', back_populates='watchlist', lazy='select', cascade='all, delete-orphan', passive_deletes=True)
     
     def __repr__(self):
         """String representation."""
@@ -32,13 +36,13 @@ class Watchlist(db.Model):
             'name': self.name,
             'description': self.description,
             'is_default': self.is_default,
-            'item_count': self.items.count(),
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+            'item_count': self.item_count,
+            'created_at': _ISO(self.created_at) if self.created_at else None,
+            'updated_at': _ISO(self.updated_at) if self.updated_at else None
         }
         
         if include_items:
-            data['items'] = [item.to_dict() for item in self.items.all()]
+            data['items'] = [item.to_dict() for item in self.items]
         
         return data
 
@@ -49,10 +53,11 @@ class WatchlistItem(db.Model):
     __tablename__ = 'watchlist_items'
     
     id = db.Column(db.Integer, primary_key=True)
-    watchlist_id = db.Column(db.Integer, db.ForeignKey('watchlists.id'), nullable=False, index=True)
+    # Indexed through the leading column of uq_watchlist_symbol
+    watchlist_id = db.Column(db.Integer, db.ForeignKey('watchlists.id', ondelete='CASCADE'), nullable=False)
     symbol = db.Column(db.String(20), nullable=False, index=True)
     notes = db.Column(db.Text)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    created_at = db.Column(db.DateTime(timezone=True), server_default=db.func.now(), nullable=False)
     
     # Relationships
     watchlist = db.relationship('Watchlist', back_populates='items')
@@ -73,5 +78,5 @@ class WatchlistItem(db.Model):
             'watchlist_id': self.watchlist_id,
             'symbol': self.symbol,
             'notes': self.notes,
-            'created_at': self.created_at.isoformat() if self.created_at else None
+            'created_at': _ISO(self.created_at) if self.created_at else None
         }
@@ -1 +1,51 @@
 """Services module initialization."""
+import logging
+
+import redis
+
+logger = logging.getLogger(__name__)
+
+
+def init_redis(app):
+    """
+    Create the process-wide Redis client backed by a bounded connection pool.
+    
+    Responses are left as bytes so cached JSON goes straight into orjson.
+    
+    Returns:
+        Redis client, or None if the URL is missing or invalid
+    """
+    try:
+        pool = redis.ConnectionPool.from_url(
+            app.config['REDIS_URL'],
+            max_connections=app.config.get('REDIS_MAX_CONNECTIONS', 64)
+        )
+        client = redis.Redis(connection_pool=pool)
+        logger.info("Redis connection pool initialized")
+    except Exception as e:
+        logger.error("Failed to initialize Redis: %s", e)
+        client = None
+    
+    app.extensions['redis'] = client
+    return client
+
+
+def init_services(app):
+    """Create shared service instances and register them on the app."""
+    from services.cache_service import CacheService
+    from services.stock_data_service import StockDataService
+    
+    cache_service = CacheService(
+        init_redis(app),
+        app.config.get('CACHE_DEFAULT_TIMEOUT', 300),
+        local_ttl=app.config.get('CACHE_LOCAL_TIMEOUT', 5)
+    )
+    cache_service.start_invalidation_listener()
+    
+    # Pass cache_service to StockDataService for Finnhub/Alpha Vantage caching
+    stock_service = StockDataService(app.config, cache_service)
+    
+    app.extensions['cache_service'] = cache_service
+    app.extensions['stock_service'] = stock_service
+    
+    return stock_service, cache_service
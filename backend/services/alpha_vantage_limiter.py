@@ -1,30 +1,58 @@
 """Rate limiter for Alpha Vantage API."""
 import time
-from datetime import datetime, date
+from datetime import datetime, timezone
 from threading import Lock
 import logging
 
+from services.token_bucket import RedisTokenBucket
+
 logger = logging.getLogger(__name__)
 
 
 class AlphaVantageRateLimiter:
     """
-    Thread-safe rate limiter for Alpha Vantage API.
+    Thread-safe token-bucket rate limiter for Alpha Vantage API.
     
     Free tier limits:
     - 5 API calls per minute
     - 500 API calls per day
+    
+    Minute tokens refill continuously (one every 12 seconds) on a monotonic
+    clock, so calls cannot burst across a window boundary and wall-clock
+    adjustments do not affect the limiter.
     """
     
-    def __init__(self):
-        """Initialize rate limiter."""
+    def __init__(self, capacity: int = 5, daily_limit: int = 500, redis_client=None):
+        """
+        Initialize rate limiter.
+        
+        Args:
+            capacity: Bucket size, i.e. calls allowed per minute
+            daily_limit: Calls allowed per UTC day
+            redis_client: Optional Redis client; when given, the budget is
+                shared by all worker processes and the local bucket is only
+                a fallback while Redis is unreachable
+        """
         self.lock = Lock()
-        self.minute_tokens = 5
+        self.capacity = capacity
+        self.rate = capacity / 60.0
+        self.tokens = float(capacity)
+        self.last = time.monotonic()
+        self.daily_limit = daily_limit
         self.daily_calls = 0
-        self.last_minute_reset = time.time()
-        self.last_day_reset = date.today()
+        self.last_day_reset = self._today()
+        # Monotonic time until which calls are refused after an upstream
+        # throttle; the shared bucket carries its own block, so this only
+        # gates the local fallback
+        self.cooldown_until = 0.0
+        self.shared = RedisTokenBucket(redis_client, 'av', capacity, self.rate) if redis_client else None
         
-        logger.info("Alpha Vantage rate limiter initialized (5/min, 500/day)")
+        logger.info("Alpha Vantage rate limiter initialized (%s/min, %s/day)", capacity, daily_limit)
+    
+    @staticmethod
+    def _today():
+        """Current UTC date (Alpha Vantage quotas are per day)."""
+        return datetime.now(timezone.utc).date()
     
     def can_make_request(self) -> bool:
         """
@@ -34,8 +62,10 @@ class AlphaVantageRateLimiter:
             True if request is allowed, False if rate limited
         """
         with self.lock:
-            self._reset_if_needed()
-            return self.minute_tokens > 0 and self.daily_calls < 500
+            reset_from = self._refill()
+            allowed = self.tokens >= 1 and self.daily_calls < self.daily_limit and not self._cooling_down()
+        self._log_reset(reset_from)
+        return allowed
     
     def acquire(self) -> bool:
         """
@@ -45,49 +75,98 @@ class AlphaVantageRateLimiter:
         Returns:
             True if request is allowed and token consumed, False if rate limited
         """
+        shared = self.shared.acquire(self._today().isoformat(), self.daily_limit) if self.shared else None
+        
         with self.lock:
-            self._reset_if_needed()
-            
-            if self.minute_tokens > 0 and self.daily_calls < 500:
-                self.minute_tokens -= 1
-                self.daily_calls += 1
-                
+            reset_from = self._refill()
+            if shared is not None:
+                # Mirror the shared state so get_stats reflects it
+                allowed, self.tokens, self.daily_calls = shared
+            else:
+                allowed = self.tokens >= 1 and self.daily_calls < self.daily_limit and not self._cooling_down()
+                if allowed:
+                    self.tokens -= 1
+                    self.daily_calls += 1
+            tokens, daily_calls = self.tokens, self.daily_calls
+        
+        # Log outside the lock so handler I/O never serializes acquires
+        self._log_reset(reset_from)
+        if allowed:
+            if logger.isEnabledFor(logging.DEBUG):
                 logger.debug(
-                    f"Alpha Vantage token acquired "
-                    f"(minute: {self.minute_tokens}/5, daily: {self.daily_calls}/500)"
+                    "Alpha Vantage token acquired (minute: %.1f/%s, daily: %s/%s)",
+                    tokens, self.capacity, daily_calls, self.daily_limit
                 )
-                return True
-            
+        else:
             logger.warning(
-                f"Alpha Vantage rate limit reached "
-                f"(minute: {self.minute_tokens}/5, daily: {self.daily_calls}/500)"
+                "Alpha Vantage rate limit reached (minute: %.1f/%s, daily: %s/%s)",
+                tokens, self.capacity, daily_calls, self.daily_limit
             )
-            return False
+        return allowed
     
-    def _reset_if_needed(self):
-        """Reset tokens if time windows have elapsed."""
-        now = time.time()
-        today = date.today()
+    def backoff(self, seconds: float) -> None:
+        """
+        Stop issuing calls for a while after Alpha Vantage throttled one.
         
-        # Reset minute tokens every 60 seconds
-        if now - self.last_minute_reset >= 60:
-            self.minute_tokens = 5
-            self.last_minute_reset = now
-            logger.debug("Alpha Vantage minute tokens reset to 5")
+        The free tier answers over-limit calls with HTTP 200 and a
+        'Note'/'Information' body, so the bucket can drift from the server's
+        view (e.g. another client on the same key). Emptying the bucket and
+        refusing calls for the window lets the server's count expire instead
+        of spending more calls on rejections. With Redis the block is stored
+        in the shared bucket, so every worker stops; the local cooldown
+        covers acquires that fall back while Redis is unreachable.
         
-        # Reset daily counter at midnight
+        Args:
+            seconds: Cooldown length
+        """
+        if self.shared:
+            self.shared.backoff(seconds)
+        with self.lock:
+            self.tokens = 0.0
+            self.cooldown_until = max(self.cooldown_until, time.monotonic() + seconds)
+        logger.warning("Alpha Vantage throttled; backing off for %ss", seconds)
+    
+    def _cooling_down(self) -> bool:
+        """True while a backoff() window is active."""
+        return time.monotonic() < self.cooldown_until
+    
+    def _refill(self):
+        """
+        Top up minute tokens for the elapsed time and reset the daily counter.
+        Caller holds the lock.
+        
+        Returns:
+            Daily call count before a reset, or None if no reset happened
+        """
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+        
+        # Reset daily counter at UTC midnight
+        today = self._today()
         if today > self.last_day_reset:
+            previous = self.daily_calls
             self.daily_calls = 0
             self.last_day_reset = today
-            logger.info(f"Alpha Vantage daily counter reset (was {self.daily_calls})")
+            return previous
+        return None
+    
+    @staticmethod
+    def _log_reset(previous):
+        """Log a daily counter reset reported by _refill (call without the lock)."""
+        if previous is not None:
+            logger.info("Alpha Vantage daily counter reset (was %s)", previous)
     
     def get_stats(self) -> dict:
         """Get current rate limiter statistics."""
         with self.lock:
-            self._reset_if_needed()
-            return {
-                'minute_tokens_remaining': self.minute_tokens,
+            reset_from = self._refill()
+            stats = {
+                'minute_tokens_remaining': int(self.tokens),
                 'daily_calls_used': self.daily_calls,
-                'daily_calls_remaining': 500 - self.daily_calls,
-                'can_make_request': self.minute_tokens > 0 and self.daily_calls < 500
+                'daily_calls_remaining': self.daily_limit - self.daily_calls,
+                'can_make_request': self.tokens >= 1 and self.daily_calls < self.daily_limit and not self._cooling_down(),
+                'cooldown_remaining': max(0, int(self.cooldown_until - time.monotonic()))
             }
+        self._log_reset(reset_from)
+        return stats
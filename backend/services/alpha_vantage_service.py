@@ -1,20 +1,136 @@
 """Alpha Vantage API service wrapper with aggressive caching."""
-import requests
 import logging
+from bisect import bisect_left
+from datetime import datetime, timedelta, timezone
+from operator import itemgetter
+import gevent
+import numpy as np
+import orjson
 from typing import Dict, List, Optional, Any
-from datetime import datetime
 from services.alpha_vantage_limiter import AlphaVantageRateLimiter
+from services.http_session import create_session
+from services.single_flight import SingleFlight
+from services.timestamps import utc_now_iso
 
 logger = logging.getLogger(__name__)
 
 # Ultra-aggressive cache TTLs to minimize API calls
 CACHE_TTL = {
     'quote': 3600,      # 1 hour - real-time not critical
+    'quote_stale': 32400,  # then served stale (and refreshed) for 9 hours
     'indices': 7200,    # 2 hours - changes slowly 
     'search': 86400,    # 24 hours - names don't change
+    'search_stale': 518400,  # then served stale (and revalidated) for 6 days
+    'historical': 86400,     # 1 day - past bars don't change
+    'historical_stale': 777600,  # then served stale (and revalidated) for 9 days
     'intraday': 1800,   # 30 minutes
 }
 
+# Seconds to stop calling after a throttle notice (the per-minute window)
+THROTTLE_COOLDOWN = 60
+
+
+
+def _quote_key(symbol: str) -> str:
+    """
+    Cache key for a symbol's quote.
+    
+    The symbol is a Redis Cluster hash tag, so all keys for one symbol land
+    on the same shard.
+    """
+    return f"av:quote:{{{symbol}}}"
+
+
+def _pct(value: Optional[str]) -> float:
+    """
+    Parse an Alpha Vantage percentage string such as '1.2345%'.
+    
+    Args:
+        value: Percentage string, with or without the trailing '%'
+        
+    Returns:
+        Percentage as a float (0.0 when missing or empty)
+    """
+    if not value:
+        return 0.0
+    return float(value[:-1]) if value[-1] == '%' else float(value)
+
+
+def _parse_global_quote(quote_data: Dict[str, str], symbol: str, updated_at: str) -> Dict[str, Any]:
+    """
+    Parse a GLOBAL_QUOTE payload into the app's quote shape.
+    
+    Args:
+        quote_data: 'Global Quote' object (numbers arrive as strings)
+        symbol: Requested symbol
+        updated_at: ISO timestamp to stamp the quote with
+        
+    Returns:
+        Quote dictionary
+    """
+    get = quote_data.get
+    return {
+        'symbol': symbol.upper(),
+        'name': symbol,  # Alpha Vantage doesn't return name in quote
+        'price': float(get('05. price', 0)),
+        'change': float(get('09. change', 0)),
+        'change_percent': _pct(get('10. change percent')),
+        'open': float(get('02. open', 0)),
+        'high': float(get('03. high', 0)),
+        'low': float(get('04. low', 0)),
+        'previous_close': float(get('08. previous close', 0)),
+        'volume': int(get('06. volume', 0)),
+        'updated_at': updated_at,
+        'source': 'alpha_vantage'
+    }
+
+
+def _parse_search_match(match: Dict[str, str]) -> Dict[str, str]:
+    """
+    Parse one SYMBOL_SEARCH 'bestMatches' entry.
+    
+    Args:
+        match: Match object keyed '1. symbol' .. '8. currency'
+        
+    Returns:
+        Search result dictionary
+    """
+    get = match.get
+    return {
+        'symbol': get('1. symbol', ''),
+        'name': get('2. name', ''),
+        'type': get('3. type', ''),
+        'region': get('4. region', ''),
+        'currency': get('8. currency', 'USD')
+    }
+
+
+def _since(rows: List[Dict[str, Any]], days: Optional[int]) -> List[Dict[str, Any]]:
+    """
+    Keep the rows dated within the last ``days`` calendar days.
+    
+    Args:
+        rows: Historical rows sorted oldest first by ISO 'date'
+        days: Calendar days to keep (None keeps everything)
+        
+    Returns:
+        Tail slice of rows
+    """
+    if days is None:
+        return rows
+    cutoff = (datetime.now(timezone.utc).date() - timedelta(days=days)).isoformat()
+    return rows[bisect_left(rows, cutoff, key=itemgetter('date')):]
+
+
+def _throttle_notice(data: Dict[str, Any]) -> Optional[str]:
+    """
+    Rate-limit message from an API response body, if any.
+    
+    Over-limit calls still return HTTP 200; the body carries a 'Note'
+    (older responses) or 'Information' message instead of data.
+    """
+    return data.get('Note') or data.get('Information')
+
 
 class AlphaVantageService:
     """
@@ -23,7 +139,7 @@ class AlphaVantageService:
     Strategy:
     1. ALWAYS check cache first
     2. Only call API if cache miss AND rate limit allows
-    3. If rate limited, return stale cache or None
+    3. If the cached copy is stale, return it and refresh in the background
     4. Cache ALL successful responses aggressively
     """
     
@@ -37,11 +153,17 @@ class AlphaVantageService:
         """
         self.api_key = api_key
         self.cache_service = cache_service
-        self.rate_limiter = AlphaVantageRateLimiter()
+        self.rate_limiter = AlphaVantageRateLimiter(redis_client=getattr(cache_service, 'redis_client', None))
         self.base_url = 'https://www.alphavantage.co/query'
+        self.session = create_session()
+        self.flight = SingleFlight()
         
         logger.info("Alpha Vantage service initialized with cache-first strategy")
     
+    def close(self) -> None:
+        """Release pooled HTTP connections."""
+        self.session.close()
+    
     def get_quote(self, symbol: str) -> Optional[Dict[str, Any]]:
         """
         Get real-time quote with cache-first strategy.
@@ -56,30 +178,100 @@ class AlphaVantageService:
         Returns:
             Quote data or None if unavailable
         """
-        cache_key = f"av:quote:{symbol}"
+        cache_key = _quote_key(symbol)
         
         # STEP 1: Check cache first (ALWAYS)
         if self.cache_service:
-            cached = self.cache_service.get(cache_key)
+            cached, is_stale = self.cache_service.get_swr(cache_key)
             if cached:
-                logger.debug(f"Cache HIT for {symbol} (no API call)")
+                if is_stale:
+                    # Serve immediately, refresh in the background
+                    logger.info("Returning stale cache for %s (revalidating)", symbol)
+                    self._revalidate([symbol])
+                else:
+                    logger.debug("Cache HIT for %s (no API call)", symbol)
                 return cached
         
         # STEP 2: Cache miss - try API if rate limit allows
-        if not self.rate_limiter.acquire():
-            logger.warning(f"Rate limit reached for {symbol}, checking stale cache")
+        quote = self.flight.do(cache_key, self._fetch_quote, symbol)
+        if quote:
+            # STEP 3: Cache aggressively
+            self._cache_quotes({symbol: quote})
+            return quote
+        
+        logger.error("No data available for %s (rate limited or API error, no cache)", symbol)
+        return None
+    
+    def get_quotes(self, symbols: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Get quotes for several symbols with one cache round-trip.
+        
+        Cached quotes are read with a single MGET (stale ones are served and
+        refreshed in the background) and only the misses are requested from
+        the API, subject to the rate limiter; fresh results are written back
+        in one pipeline.
+        
+        Args:
+            symbols: Stock symbols
             
-            # Try stale cache as fallback
-            if self.cache_service:
-                stale = self.cache_service.get(f"{cache_key}:stale")
-                if stale:
-                    logger.info(f"Returning stale cache for {symbol}")
-                    return stale
+        Returns:
+            Dict of symbol -> quote for the symbols that returned data
+        """
+        symbols = list(dict.fromkeys(symbols))
+        if not symbols:
+            return {}
+        
+        keys = [_quote_key(symbol) for symbol in symbols]
+        cached = self.cache_service.mget_swr(keys) if self.cache_service else [(None, False)] * len(symbols)
+        quotes = {symbol: quote for symbol, (quote, _) in zip(symbols, cached) if quote}
+        self._revalidate([symbol for symbol, (quote, is_stale) in zip(symbols, cached) if quote and is_stale])
+        
+        fresh = {}
+        for symbol in symbols:
+            if symbol not in quotes:
+                quote = self.flight.do(_quote_key(symbol), self._fetch_quote, symbol)
+                if quote:
+                    fresh[symbol] = quote
+        self._cache_quotes(fresh)
+        quotes.update(fresh)
+        return quotes
+    
+    def _revalidate(self, symbols: List[str]) -> None:
+        """
+        Refresh stale quotes on background greenlets, one in flight per symbol.
+        
+        Args:
+            symbols: Symbols whose cached quote is stale
+        """
+        for symbol in symbols:
+            if not self.flight.in_flight(_quote_key(symbol)):
+                gevent.spawn(self._refresh_quote, symbol)
+    
+    def _refresh_quote(self, symbol: str) -> None:
+        """
+        Fetch and cache a quote (background revalidation).
+        
+        Args:
+            symbol: Stock symbol
+        """
+        quote = self.flight.do(_quote_key(symbol), self._fetch_quote, symbol)
+        if quote:
+            self._cache_quotes({symbol: quote})
+    
+    def _fetch_quote(self, symbol: str) -> Optional[Dict[str, Any]]:
+        """
+        Fetch a quote from the API.
+        
+        Args:
+            symbol: Stock symbol
             
-            logger.error(f"No data available for {symbol} (rate limited, no cache)")
+        Returns:
+            Parsed quote, or None if rate limited or unavailable
+        """
+        if not self.rate_limiter.acquire():
+            logger.warning("Rate limit reached for %s", symbol)
             return None
         
-        # STEP 3: Make API call
         try:
             params = {
                 'function': 'GLOBAL_QUOTE',
@@ -87,64 +279,46 @@ class AlphaVantageService:
                 'apikey': self.api_key
             }
             
-            response = requests.get(self.base_url, params=params, timeout=10)
+            response = self.session.get(self.base_url, params=params, timeout=10)
             response.raise_for_status()
-            data = response.json()
+            data = orjson.loads(response.content)
             
             # Check for API error
             if 'Error Message' in data:
-                logger.error(f"Alpha Vantage error for {symbol}: {data['Error Message']}")
+                logger.error("Alpha Vantage error for %s: %s", symbol, data['Error Message'])
                 return None
             
-            if 'Note' in data:
-                logger.warning(f"Alpha Vantage note for {symbol}: {data['Note']}")
+            if self._throttled(data, symbol):
                 return None
             
             quote_data = data.get('Global Quote', {})
             if not quote_data:
-                logger.warning(f"No quote data returned for {symbol}")
+                logger.warning("No quote data returned for %s", symbol)
                 return None
             
-            # Parse quote
-            quote = {
-                'symbol': symbol.upper(),
-                'name': symbol,  # Alpha Vantage doesn't return name in quote
-                'price': float(quote_data.get('05. price', 0)),
-                'change': float(quote_data.get('09. change', 0)),
-                'change_percent': float(quote_data.get('10. change percent', '0').replace('%', '')),
-                'open': float(quote_data.get('02. open', 0)),
-                'high': float(quote_data.get('03. high', 0)),
-                'low': float(quote_data.get('04. low', 0)),
-                'previous_close': float(quote_data.get('08. previous close', 0)),
-                'volume': int(quote_data.get('06. volume', 0)),
-                'updated_at': datetime.utcnow().isoformat(),
-                'source': 'alpha_vantage'
-            }
-            
-            # STEP 4: Cache aggressively
-            if self.cache_service:
-                # Regular cache (1 hour)
-                self.cache_service.set(cache_key, quote, CACHE_TTL['quote'])
-                
-                # Stale backup (10 hours)
-                self.cache_service.set(f"{cache_key}:stale", quote, CACHE_TTL['quote'] * 10)
-                
-                logger.info(f"Cached quote for {symbol} (1h fresh, 10h stale)")
-            
-            return quote
+            return _parse_global_quote(quote_data, symbol, utc_now_iso())
             
         except Exception as e:
-            logger.error(f"Alpha Vantage API error for {symbol}: {e}")
-            
-            # Try stale cache on error
-            if self.cache_service:
-                stale = self.cache_service.get(f"{cache_key}:stale")
-                if stale:
-                    logger.info(f"Returning stale cache after error for {symbol}")
-                    return stale
-            
+            logger.error("Alpha Vantage API error for %s: %s", symbol, e)
             return None
     
+    def _cache_quotes(self, quotes: Dict[str, Dict[str, Any]]) -> None:
+        """
+        Cache fresh quotes (1h, then servable stale for 9h) in one pipeline.
+        
+        Args:
+            quotes: Dict of symbol -> quote
+        """
+        if not self.cache_service or not quotes:
+            return
+        
+        self.cache_service.mset_swr(
+            {_quote_key(symbol): quote for symbol, quote in quotes.items()},
+            CACHE_TTL['quote'],
+            CACHE_TTL['quote_stale']
+        )
+        logger.info("Cached quotes for %s (1h fresh, 9h more stale)", list(quotes))
+    
     def search_symbol(self, keywords: str) -> List[Dict[str, Any]]:
         """
         Search for symbols with cache-first strategy.
@@ -159,14 +333,30 @@ class AlphaVantageService:
         
         # Check cache first
         if self.cache_service:
-            cached = self.cache_service.get(cache_key)
+            cached, is_stale = self.cache_service.get_swr(cache_key)
             if cached:
-                logger.debug(f"Cache HIT for search '{keywords}' (no API call)")
+                if is_stale and not self.flight.in_flight(cache_key):
+                    gevent.spawn(self.flight.do, cache_key, self._fetch_search, keywords, cache_key)
+                logger.debug("Cache HIT for search '%s' (stale: %s)", keywords, is_stale)
                 return cached
         
+        # Concurrent misses for the same query share one API call
+        return self.flight.do(cache_key, self._fetch_search, keywords, cache_key)
+    
+    def _fetch_search(self, keywords: str, cache_key: str) -> List[Dict[str, Any]]:
+        """
+        Search symbols via the API and cache the results.
+        
+        Args:
+            keywords: Search keywords
+            cache_key: Key to cache the results under
+            
+        Returns:
+            List of matching symbols
+        """
         # Try API if rate limit allows
         if not self.rate_limiter.acquire():
-            logger.warning(f"Rate limit reached for search '{keywords}'")
+            logger.warning("Rate limit reached for search '%s'", keywords)
             return []
         
         try:
@@ -176,64 +366,164 @@ class AlphaVantageService:
                 'apikey': self.api_key
             }
             
-            response = requests.get(self.base_url, params=params, timeout=10)
-            response.raise_for_status()
-            data = response.json()
+            data, validators = self._conditional_get(params, cache_key, timeout=10)
+            if data is None:
+                return self._not_modified(cache_key, CACHE_TTL['search'], CACHE_TTL['search_stale'])
             
-            matches = data.get('bestMatches', [])
-            results = []
+            if self._throttled(data, f"search '{keywords}'"):
+                return []
             
-            for match in matches:
-                results.append({
-                    'symbol': match.get('1. symbol', ''),
-                    'name': match.get('2. name', ''),
-                    'type': match.get('3. type', ''),
-                    'region': match.get('4. region', ''),
-                    'currency': match.get('8. currency', 'USD')
-                })
+            results = [_parse_search_match(match) for match in data.get('bestMatches', [])]
             
-            # Cache for 24 hours (names don't change)
-            if self.cache_service and results:
-                self.cache_service.set(cache_key, results, CACHE_TTL['search'])
-                logger.info(f"Cached search results for '{keywords}' (24h)")
+            # Fresh for 24 hours (names don't change)
+            if results:
+                self._store(cache_key, results, CACHE_TTL['search'], CACHE_TTL['search_stale'], validators)
+                logger.info("Cached search results for '%s' (24h)", keywords)
             
             return results
             
         except Exception as e:
-            logger.error(f"Search error for '{keywords}': {e}")
+            logger.error("Search error for '%s': %s", keywords, e)
+            return []
+    
+    def _conditional_get(self, params: Dict[str, Any], cache_key: str, timeout: int):
+        """
+        Call the API, revalidating a cached body with its stored validators.
+        
+        Args:
+            params: Query parameters
+            cache_key: Key the body is cached under
+            timeout: Request timeout in seconds
+            
+        Returns:
+            (data, validators) tuple; data is None when the server answered
+            304 Not Modified. validators holds the response's ETag and
+            Last-Modified, if it sent any.
+        """
+        headers = {}
+        validators = self.cache_service.get(f"{cache_key}:validators") if self.cache_service else None
+        if validators:
+            if validators.get('etag'):
+                headers['If-None-Match'] = validators['etag']
+            if validators.get('last_modified'):
+                headers['If-Modified-Since'] = validators['last_modified']
+        
+        response = self.session.get(self.base_url, params=params, headers=headers, timeout=timeout)
+        if response.status_code == 304:
+            return None, validators
+        response.raise_for_status()
+        
+        validators = {
+            name: value for name, value in (
+                ('etag', response.headers.get('ETag')),
+                ('last_modified', response.headers.get('Last-Modified'))
+            ) if value
+        }
+        return orjson.loads(response.content), validators
+    
+    def _store(self, cache_key: str, value: Any, timeout: int, stale_timeout: int, validators: Optional[Dict[str, str]]) -> None:
+        """
+        Cache a parsed body with a stale window, plus its validators if any.
+        
+        Args:
+            cache_key: Cache key
+            value: Parsed value to cache
+            timeout: Seconds the value is fresh
+            stale_timeout: Further seconds it may be served stale
+            validators: ETag/Last-Modified for later conditional requests
+        """
+        if not self.cache_service:
+            return
+        self.cache_service.set_swr(cache_key, value, timeout, stale_timeout)
+        if validators:
+            self.cache_service.set(f"{cache_key}:validators", validators, timeout + stale_timeout)
+    
+    def _not_modified(self, cache_key: str, timeout: int, stale_timeout: int) -> List[Dict[str, Any]]:
+        """
+        Handle a 304: renew the cached body's freshness without re-parsing.
+        
+        Args:
+            cache_key: Cache key of the revalidated body
+            timeout: Seconds the value is fresh again
+            stale_timeout: Further seconds it may be served stale
+            
+        Returns:
+            The cached value, or [] if it expired meanwhile
+        """
+        cached, _ = self.cache_service.get_swr(cache_key)
+        if not cached:
             return []
+        self._store(cache_key, cached, timeout, stale_timeout, self.cache_service.get(f"{cache_key}:validators"))
+        logger.debug("Not modified, renewed %s", cache_key)
+        return cached
+    
+    def _throttled(self, data: Dict[str, Any], what: str) -> bool:
+        """
+        Check a response for a throttle notice and back off if found.
+        
+        No retry is attempted here: callers are serving requests (or
+        revalidating a stale entry that is still being served), so the
+        call simply misses and the next one happens after the cooldown.
+        
+        Args:
+            data: Decoded response body
+            what: Description of the call, for the log
+            
+        Returns:
+            True if the call was throttled
+        """
+        notice = _throttle_notice(data)
+        if not notice:
+            return False
+        logger.warning("Alpha Vantage throttled %s: %s", what, notice)
+        self.rate_limiter.backoff(THROTTLE_COOLDOWN)
+        return True
     
     def get_rate_limit_stats(self) -> Dict[str, Any]:
         """Get current rate limiter statistics."""
         return self.rate_limiter.get_stats()
-    def get_historical_data(self, symbol: str, outputsize: str = 'compact') -> List[Dict[str, Any]]:
+    
+    def get_historical_data(self, symbol: str, outputsize: str = 'compact', days: Optional[int] = None) -> List[Dict[str, Any]]:
         """
         Get historical daily data from Alpha Vantage.
         
         Args:
             symbol: Stock symbol
             outputsize: 'compact' (100 days) or 'full' (20+ years)
+            days: Only return the last this many calendar days (None for all)
             
         Returns:
-            List of historical price dictionaries
+            List of historical price dictionaries, oldest first
         """
         cache_key = f"av:historical:{symbol}:{outputsize}"
         
         # Check cache first
         if self.cache_service:
-            cached = self.cache_service.get(cache_key)
+            cached, is_stale = self.cache_service.get_swr(cache_key)
             if cached:
-                logger.debug(f"Cache HIT for historical {symbol}")
-                return cached
+                if is_stale and not self.flight.in_flight(cache_key):
+                    gevent.spawn(self.flight.do, cache_key, self._fetch_historical_data, symbol, outputsize, cache_key)
+                logger.debug("Cache HIT for historical %s (stale: %s)", symbol, is_stale)
+                return _since(cached, days)
         
+        # Concurrent misses for the same series share one API call
+        return _since(self.flight.do(cache_key, self._fetch_historical_data, symbol, outputsize, cache_key), days)
+    
+    def _fetch_historical_data(self, symbol: str, outputsize: str, cache_key: str) -> List[Dict[str, Any]]:
+        """
+        Fetch daily history via the API and cache it.
+        
+        Args:
+            symbol: Stock symbol
+            outputsize: 'compact' or 'full'
+            cache_key: Key to cache the series under
+            
+        Returns:
+            List of historical price dictionaries
+        """
         # Try API if rate limit allows
         if not self.rate_limiter.acquire():
-            logger.warning(f"Rate limit reached for historical {symbol}")
-            # Try stale cache
-            if self.cache_service:
-                stale = self.cache_service.get(f"{cache_key}:stale")
-                if stale:
-                    return stale
+            logger.warning("Rate limit reached for historical %s", symbol)
             return []
         
         try:
@@ -244,39 +534,44 @@ class AlphaVantageService:
                 'apikey': self.api_key
             }
             
-            response = requests.get(self.base_url, params=params, timeout=15)
-            response.raise_for_status()
-            data = response.json()
+            data, validators = self._conditional_get(params, cache_key, timeout=15)
+            if data is None:
+                return self._not_modified(cache_key, CACHE_TTL['historical'], CACHE_TTL['historical_stale'])
             
             # Check for errors
-            if 'Error Message' in data or 'Note' in data:
-                logger.warning(f"Alpha Vantage error for historical {symbol}")
+            if self._throttled(data, f"historical {symbol}"):
+                return []
+            if 'Error Message' in data:
+                logger.warning("Alpha Vantage error for historical %s: %s", symbol, data['Error Message'])
                 return []
             
             time_series = data.get('Time Series (Daily)', {})
             if not time_series:
                 return []
             
-            # Convert to list format
-            historical_data = []
-            for date_str, values in sorted(time_series.items()):
-                historical_data.append({
-                    'date': date_str,
-                    'open': float(values['1. open']),
-                    'high': float(values['2. high']),
-                    'low': float(values['3. low']),
-                    'close': float(values['4. close']),
-                    'volume': int(values['5. volume'])
-                })
+            # Convert to list format (oldest first)
+            dates = sorted(time_series)
+            rows = [time_series[d] for d in dates]
+            # Alpha Vantage sends numbers as strings; parse each column in one pass
+            prices = np.array(
+                [(v['1. open'], v['2. high'], v['3. low'], v['4. close']) for v in rows],
+                dtype=np.float64
+            ).T.tolist()
+            volumes = np.array([v['5. volume'] for v in rows]).astype(np.int64).tolist()
+            
+            historical_data = [
+                {'date': d, 'open': o, 'high': h, 'low': l, 'close': c, 'volume': vol}
+                for d, o, h, l, c, vol in zip(dates, *prices, volumes)
+            ]
             
-            # Cache for 1 day (historical data doesn't change)
-            if self.cache_service and historical_data:
-                self.cache_service.set(cache_key, historical_data, 86400)  # 24 hours
-                self.cache_service.set(f"{cache_key}:stale", historical_data, 864000)  # 10 days
-                logger.info(f"Cached historical data for {symbol}")
+            # Fresh for 1 day (historical data doesn't change), then served
+            # stale while revalidating for 9 more
+            if historical_data:
+                self._store(cache_key, historical_data, CACHE_TTL['historical'], CACHE_TTL['historical_stale'], validators)
+                logger.info("Cached historical data for %s", symbol)
             
             return historical_data
             
         except Exception as e:
-            logger.error(f"Error getting historical data for {symbol}: {e}")
+            logger.error("Error getting historical data for %s: %s", symbol, e)
             return []
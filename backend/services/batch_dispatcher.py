@@ -0,0 +1,97 @@
+"""Micro-batching of concurrent single-item requests."""
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class BatchDispatcher:
+    """
+    Collect concurrent single-key requests into batched handler calls.
+    
+    Callers block in submit(); a background worker drains whatever arrived
+    within max_wait (up to max_batch keys), calls the handler once for the
+    unique keys and resolves every waiting caller from its result.
+    """
+    
+    def __init__(
+        self,
+        handler: Callable[[List[str]], Dict[str, Any]],
+        max_batch: int = 32,
+        max_wait: float = 0.02,
+        timeout: float = 15
+    ):
+        """
+        Initialize the dispatcher.
+        
+        Args:
+            handler: Called with a list of unique keys; returns key -> result
+                (keys missing from the result resolve to None)
+            max_batch: Maximum keys per handler call
+            max_wait: Seconds to wait for more keys after the first arrives
+            timeout: Seconds a caller waits for its result
+        """
+        self.handler = handler
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.timeout = timeout
+        self._queue: queue.Queue = queue.Queue()
+        self._worker: Optional[threading.Thread] = None
+        self._worker_lock = threading.Lock()
+    
+    def submit(self, key: str) -> Any:
+        """
+        Request one key and wait for its batched result.
+        
+        Args:
+            key: Item to resolve
+            
+        Returns:
+            The handler's result for key, or None
+        """
+        self._ensure_worker()
+        future: Future = Future()
+        self._queue.put((key, future))
+        return future.result(timeout=self.timeout)
+    
+    def _ensure_worker(self) -> None:
+        """Start the background worker on first use (after any fork)."""
+        if self._worker and self._worker.is_alive():
+            return
+        with self._worker_lock:
+            if not (self._worker and self._worker.is_alive()):
+                self._worker = threading.Thread(target=self._run, name='batch-dispatcher', daemon=True)
+                self._worker.start()
+    
+    def _run(self) -> None:
+        """Worker loop: gather a batch, dispatch it, repeat."""
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._dispatch(batch)
+    
+    def _dispatch(self, batch) -> None:
+        """Run the handler for a batch and resolve its futures."""
+        keys = list(dict.fromkeys(key for key, _ in batch))
+        try:
+            results = self.handler(keys)
+        except Exception as e:
+            logger.error("Batch handler failed for %s: %s", keys, e)
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        
+        for key, future in batch:
+            future.set_result(results.get(key))
@@ -1,31 +1,171 @@
 """Cache service using Redis."""
 import redis
-import json
+import orjson
+import hashlib
+import inspect
 import logging
-from typing import Any, Optional
+import os
+import socket
+import threading
+import time
+import zlib
+from fnmatch import fnmatchcase
+from cachetools import TTLCache
+from typing import Any, Callable, Dict, List, Optional, Tuple
 from functools import wraps
 
 logger = logging.getLogger(__name__)
 
+# Same leniency as json.dumps for int dict keys, plus NumPy scalars/arrays
+# coming out of the indicator calculations
+_DUMPS_OPTION = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+# Pub/sub channel carrying invalidations to every process's in-process
+# cache; messages are '<sender> k:<key>[\n<key>...]' or '<sender> p:<pattern>'
+INVALIDATION_CHANNEL = 'cache:invalidate'
+
+_HOSTNAME = socket.gethostname()
+
+# Keys examined per SCAN call and removed per UNLINK in delete_pattern
+_SCAN_BATCH = 500
+
+# Payloads above this size (mostly historical price arrays) are compressed;
+# they are marked with a leading byte that JSON text never starts with
+_COMPRESS_MIN_BYTES = 2048
+_COMPRESSED = b'\x01'
+
+
+def _dumps(value: Any) -> bytes:
+    """Serialize a cache value to JSON bytes, compressing large payloads."""
+    blob = orjson.dumps(value, option=_DUMPS_OPTION)
+    if len(blob) > _COMPRESS_MIN_BYTES:
+        return _COMPRESSED + zlib.compress(blob, 1)
+    return blob
+
+
+def _loads(blob: bytes) -> Any:
+    """Deserialize a cache value written by _dumps."""
+    if blob[:1] == _COMPRESSED:
+        blob = zlib.decompress(blob[1:])
+    return orjson.loads(blob)
+
+
+def _sender_id() -> str:
+    """Identify this process in invalidation messages (read per call, so forks get their own)."""
+    return f"{_HOSTNAME}:{os.getpid()}"
+
+
+def hashed_key(namespace: str, *parts: Any) -> str:
+    """
+    Build a fixed-length cache key from arbitrary parts.
+    
+    The parts are hashed with BLAKE2b into 16 hex characters, so long or
+    user-supplied inputs (search queries, parameter combinations) do not
+    inflate key size.
+    
+    Args:
+        namespace: Readable key prefix, e.g. 'search'
+        parts: Values identifying the cached item
+        
+    Returns:
+        Key of the form '<namespace>:<16 hex chars>'
+    """
+    digest = hashlib.blake2b('|'.join(map(str, parts)).encode(), digest_size=8).hexdigest()
+    return f"{namespace}:{digest}"
+
 
 class CacheService:
     """Redis-based caching service."""
     
-    def __init__(self, redis_url: str, default_timeout: int = 300):
+    def __init__(
+        self,
+        redis_client: Optional[redis.Redis],
+        default_timeout: int = 300,
+        local_ttl: int = 5,
+        local_maxsize: int = 2048
+    ):
         """
         Initialize cache service.
         
         Args:
-            redis_url: Redis connection URL
+            redis_client: Shared Redis client (bytes responses), or None to
+                run without Redis
             default_timeout: Default cache timeout in seconds
+            local_ttl: Seconds a value stays in the in-process cache
+            local_maxsize: Maximum number of keys in the in-process cache
         """
+        # Short-lived per-process copy of hot keys (L1 in front of Redis);
+        # holds parsed objects so a repeat hit skips both the Redis
+        # round-trip and JSON decoding. Values are shared between callers
+        # and must not be mutated. TTLCache is not thread-safe, hence the lock.
+        self._local = TTLCache(maxsize=local_maxsize, ttl=local_ttl)
+        self._local_lock = threading.Lock()
+        
+        self.redis_client = redis_client
+        self.default_timeout = default_timeout
+        self._pubsub_worker = None
+    
+    def start_invalidation_listener(self) -> bool:
+        """
+        Subscribe to invalidations published by other processes.
+        
+        Every write (set/mset and the SWR variants) and every delete publishes
+        on INVALIDATION_CHANNEL; the listener drops the named keys from this
+        process's in-process cache so a superseded copy is not served for the
+        rest of its local TTL. A process ignores its own messages, since its
+        L1 was already updated by the write itself.
+        
+        Returns:
+            True if the listener is running, False otherwise
+        """
+        if not self.redis_client or self._pubsub_worker:
+            return bool(self._pubsub_worker)
+        
+        try:
+            pubsub = self.redis_client.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(**{INVALIDATION_CHANNEL: self._on_invalidation})
+            self._pubsub_worker = pubsub.run_in_thread(sleep_time=1, daemon=True)
+            return True
+        except Exception as e:
+            logger.error("Cache invalidation listener error: %s", e)
+            return False
+    
+    def _on_invalidation(self, message: Dict[str, Any]) -> None:
+        """Drop the keys or pattern named in another process's invalidation from L1."""
+        sender, _, data = message['data'].decode().partition(' ')
+        if sender == _sender_id():
+            return
+        kind, target = data[:2], data[2:]
+        if kind == 'k:':
+            with self._local_lock:
+                for key in target.split('\n'):
+                    self._local.pop(key, None)
+        elif kind == 'p:':
+            self._local_pop_pattern(target)
+    
+    def _local_pop(self, key: str) -> None:
+        """Remove a key from the in-process cache."""
+        with self._local_lock:
+            self._local.pop(key, None)
+    
+    def _local_pop_pattern(self, pattern: str) -> None:
+        """Remove keys matching a glob pattern from the in-process cache."""
+        with self._local_lock:
+            for key in [k for k in list(self._local) if fnmatchcase(k, pattern)]:
+                self._local.pop(key, None)
+    
+    @staticmethod
+    def _invalidation(kind: str, targets: List[str]) -> str:
+        """Build an invalidation message ('k' for keys, 'p' for a pattern)."""
+        return f"{_sender_id()} {kind}:" + '\n'.join(targets)
+    
+    def _publish_invalidation(self, message: str) -> None:
+        """Tell other processes to drop an invalidated key or pattern."""
         try:
-            self.redis_client = redis.from_url(redis_url, decode_responses=True)
-            self.default_timeout = default_timeout
-            logger.info("Redis cache initialized successfully")
+            self.redis_client.publish(INVALIDATION_CHANNEL, message)
         except Exception as e:
-            logger.error(f"Failed to initialize Redis: {e}")
-            self.redis_client = None
+            logger.error("Cache invalidation publish error for %s: %s", message, e)
     
     def get(self, key: str) -> Optional[Any]:
         """
@@ -37,16 +177,24 @@ class CacheService:
         Returns:
             Cached value or None if not found or cache unavailable
         """
+        with self._local_lock:
+            value = self._local.get(key)
+        if value is not None:
+            return value
+        
         if not self.redis_client:
             return None
         
         try:
             value = self.redis_client.get(key)
             if value:
-                return json.loads(value)
+                value = _loads(value)
+                with self._local_lock:
+                    self._local[key] = value
+                return value
             return None
         except Exception as e:
-            logger.error(f"Cache get error for key {key}: {e}")
+            logger.error("Cache get error for key %s: %s", key, e)
             return None
     
     def set(self, key: str, value: Any, timeout: Optional[int] = None) -> bool:
@@ -66,11 +214,190 @@ class CacheService:
         
         try:
             timeout = timeout or self.default_timeout
-            serialized = json.dumps(value)
-            self.redis_client.setex(key, timeout, serialized)
+            # Write and invalidate other processes' L1 copies in one round-trip
+            pipe = self.redis_client.pipeline(transaction=False)
+            pipe.setex(key, timeout, _dumps(value))
+            pipe.publish(INVALIDATION_CHANNEL, self._invalidation('k', [key]))
+            pipe.execute()
+            with self._local_lock:
+                self._local[key] = value
+            return True
+        except Exception as e:
+            logger.error("Cache set error for key %s: %s", key, e)
+            return False
+    
+    def mget(self, keys: List[str]) -> List[Optional[Any]]:
+        """
+        Get multiple values in a single MGET round-trip.
+        
+        Args:
+            keys: Cache keys
+            
+        Returns:
+            List of cached values (None for misses), in the same order as keys
+        """
+        with self._local_lock:
+            values = [self._local.get(key) for key in keys]
+        missing = [i for i, value in enumerate(values) if value is None]
+        
+        if not self.redis_client or not missing:
+            return values
+        
+        try:
+            raws = self.redis_client.mget([keys[i] for i in missing])
+            for i, raw in zip(missing, raws):
+                if raw:
+                    values[i] = _loads(raw)
+            with self._local_lock:
+                for i in missing:
+                    if values[i] is not None:
+                        self._local[keys[i]] = values[i]
+            return values
+        except Exception as e:
+            logger.error("Cache mget error for keys %s: %s", keys, e)
+            return values
+    
+    def mset(
+        self,
+        mapping: Dict[str, Any],
+        timeout: Optional[int] = None,
+        timeouts: Optional[Dict[str, int]] = None
+    ) -> bool:
+        """
+        Set multiple values in a single pipelined round-trip.
+        
+        Args:
+            mapping: Keys and values to cache (values must be JSON serializable)
+            timeout: Cache timeout in seconds for every key (uses default if None)
+            timeouts: Optional per-key timeouts overriding ``timeout``
+            
+        Returns:
+            True if successful, False otherwise
+        """
+        if not self.redis_client or not mapping:
+            return False
+        
+        try:
+            timeout = timeout or self.default_timeout
+            timeouts = timeouts or {}
+            pipe = self.redis_client.pipeline(transaction=False)
+            for key, value in mapping.items():
+                pipe.setex(key, timeouts.get(key, timeout), _dumps(value))
+            pipe.publish(INVALIDATION_CHANNEL, self._invalidation('k', list(mapping)))
+            pipe.execute()
+            with self._local_lock:
+                self._local.update(mapping)
+            return True
+        except Exception as e:
+            logger.error("Cache mset error for keys %s: %s", list(mapping), e)
+            return False
+    
+    def get_swr(self, key: str) -> Tuple[Optional[Any], bool]:
+        """
+        Get a value written by set_swr.
+        
+        Args:
+            key: Cache key
+            
+        Returns:
+            (value, is_stale) tuple; value is None on a miss. A stale value
+            is still servable but should be refreshed in the background.
+        """
+        return self.mget_swr([key])[0]
+    
+    def mget_swr(self, keys: List[str]) -> List[Tuple[Optional[Any], bool]]:
+        """
+        Get multiple values written by set_swr in one round-trip.
+        
+        Args:
+            keys: Cache keys
+            
+        Returns:
+            List of (value, is_stale) tuples, in the same order as keys
+        """
+        now = time.time()
+        return [
+            (entry['v'], now >= entry['fresh_until'])
+            if isinstance(entry, dict) and 'fresh_until' in entry else (None, False)
+            for entry in self.mget(keys)
+        ]
+    
+    def set_swr(self, key: str, value: Any, timeout: int, stale_timeout: int) -> bool:
+        """
+        Set a value with a stale-while-revalidate window.
+        
+        Args:
+            key: Cache key
+            value: Value to cache (must be JSON serializable)
+            timeout: Seconds the value is fresh
+            stale_timeout: Further seconds it may be served stale
+            
+        Returns:
+            True if successful, False otherwise
+        """
+        return self.mset_swr({key: value}, timeout, stale_timeout)
+    
+    def mset_swr(self, mapping: Dict[str, Any], timeout: int, stale_timeout: int) -> bool:
+        """
+        Set multiple values with a stale-while-revalidate window.
+        
+        Each value is stored once, wrapped with its freshness deadline, and
+        expires from Redis when the stale window ends.
+        
+        Args:
+            mapping: Keys and values to cache (values must be JSON serializable)
+            timeout: Seconds the values are fresh
+            stale_timeout: Further seconds they may be served stale
+            
+        Returns:
+            True if successful, False otherwise
+        """
+        fresh_until = time.time() + timeout
+        return self.mset(
+            {key: {'v': value, 'fresh_until': fresh_until} for key, value in mapping.items()},
+            timeout + stale_timeout
+        )
+    
+    def hget(self, name: str, field: str) -> Optional[bytes]:
+        """
+        Get a field from a Redis hash.
+        
+        Args:
+            name: Hash key
+            field: Field within the hash
+            
+        Returns:
+            Raw bytes value or None if not found
+        """
+        if not self.redis_client:
+            return None
+        
+        try:
+            return self.redis_client.hget(name, field)
+        except Exception as e:
+            logger.error("Cache hget error for %s[%s]: %s", name, field, e)
+            return None
+    
+    def hset(self, name: str, field: str, value: Any) -> bool:
+        """
+        Set a field in a Redis hash. Hash fields do not expire.
+        
+        Args:
+            name: Hash key
+            field: Field within the hash
+            value: Scalar value to store
+            
+        Returns:
+            True if successful, False otherwise
+        """
+        if not self.redis_client:
+            return False
+        
+        try:
+            self.redis_client.hset(name, field, value)
             return True
         except Exception as e:
-            logger.error(f"Cache set error for key {key}: {e}")
+            logger.error("Cache hset error for %s[%s]: %s", name, field, e)
             return False
     
     def delete(self, key: str) -> bool:
@@ -83,36 +410,51 @@ class CacheService:
         Returns:
             True if successful, False otherwise
         """
+        self._local_pop(key)
+        
         if not self.redis_client:
             return False
         
         try:
             self.redis_client.delete(key)
+            self._publish_invalidation(self._invalidation('k', [key]))
             return True
         except Exception as e:
-            logger.error(f"Cache delete error for key {key}: {e}")
+            logger.error("Cache delete error for key %s: %s", key, e)
             return False
     
     def delete_pattern(self, pattern: str) -> bool:
         """
         Delete all keys matching a pattern.
         
+        Keys are found with incremental SCAN (KEYS would block Redis for the
+        whole keyspace walk) and removed with UNLINK, which frees memory off
+        the main Redis thread, in pipelined batches.
+        
         Args:
             pattern: Redis key pattern (e.g., 'stock:*')
             
         Returns:
             True if successful, False otherwise
         """
+        self._local_pop_pattern(pattern)
+        
         if not self.redis_client:
             return False
         
         try:
-            keys = self.redis_client.keys(pattern)
-            if keys:
-                self.redis_client.delete(*keys)
+            batch = []
+            for key in self.redis_client.scan_iter(match=pattern, count=_SCAN_BATCH):
+                batch.append(key)
+                if len(batch) >= _SCAN_BATCH:
+                    self.redis_client.unlink(*batch)
+                    batch.clear()
+            if batch:
+                self.redis_client.unlink(*batch)
+            self._publish_invalidation(self._invalidation('p', [pattern]))
             return True
         except Exception as e:
-            logger.error(f"Cache delete pattern error for {pattern}: {e}")
+            logger.error("Cache delete pattern error for %s: %s", pattern, e)
             return False
     
     def exists(self, key: str) -> bool:
@@ -131,7 +473,7 @@ class CacheService:
         try:
             return bool(self.redis_client.exists(key))
         except Exception as e:
-            logger.error(f"Cache exists error for key {key}: {e}")
+            logger.error("Cache exists error for key %s: %s", key, e)
             return False
     
     def get_ttl(self, key: str) -> Optional[int]:
@@ -151,44 +493,60 @@ class CacheService:
             ttl = self.redis_client.ttl(key)
             return ttl if ttl > 0 else None
         except Exception as e:
-            logger.error(f"Cache TTL error for key {key}: {e}")
+            logger.error("Cache TTL error for key %s: %s", key, e)
             return None
 
 
-def cached(key_prefix: str, timeout: Optional[int] = None):
+def _app_cache_service() -> Optional['CacheService']:
+    """Default cache for @cached: the instance registered on the current app."""
+    from flask import current_app
+    return current_app.extensions.get('cache_service')
+
+
+def cached(
+    key_prefix: str,
+    timeout: Optional[int] = None,
+    cache_service: Optional[Callable[[], Optional['CacheService']]] = None
+):
     """
     Decorator for caching function results.
     
+    The signature is bound once at decoration time, so a call's key depends
+    only on the argument values (positional or keyword, defaults applied)
+    and is a fixed-length hash built by hashed_key. None results are not
+    cached.
+    
     Args:
         key_prefix: Prefix for cache key
         timeout: Cache timeout in seconds
+        cache_service: Zero-argument callable returning the CacheService to
+            use; defaults to the one registered on the current Flask app
         
     Usage:
         @cached('stock_quote', timeout=60)
         def get_stock_quote(symbol):
             return fetch_quote(symbol)
     """
+    get_cache = cache_service or _app_cache_service
+    
     def decorator(func):
+        signature = inspect.signature(func)
+        
         @wraps(func)
         def wrapper(*args, **kwargs):
-            # Build cache key from function arguments
-            cache_key_parts = [key_prefix]
-            
-            # Add args to key
-            for arg in args:
-                if isinstance(arg, (str, int, float)):
-                    cache_key_parts.append(str(arg))
-            
-            # Add kwargs to key
-            for k, v in sorted(kwargs.items()):
-                if isinstance(v, (str, int, float)):
-                    cache_key_parts.append(f"{k}={v}")
+            cache = get_cache()
+            if cache is None:
+                return func(*args, **kwargs)
             
-            cache_key = ":".join(cache_key_parts)
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            cache_key = hashed_key(key_prefix, *bound.arguments.values())
             
-            # Try to get from cache (requires cache_service in function scope)
-            # This is a simplified version - production would handle cache_service injection
-            result = func(*args, **kwargs)
+            result = cache.get(cache_key)
+            if result is None:
+                result = func(*args, **kwargs)
+                if result is not None:
+                    cache.set(cache_key, result, timeout)
             
             return result
         
@@ -1,54 +1,65 @@
 """Rate limiter for Finnhub API - 60 calls per minute free tier"""
 import time
 import logging
-from collections import deque
+from threading import Lock
+from services.token_bucket import RedisTokenBucket
 
 logger = logging.getLogger(__name__)
 
 
 class FinnhubRateLimiter:
-    """Rate limiter for Finnhub API (60 calls/minute)"""
+    """Token-bucket rate limiter for Finnhub API (60 calls/minute), O(1) per call"""
     
-    def __init__(self, calls_per_minute=60):
+    def __init__(self, calls_per_minute=60, redis_client=None):
+        """With a redis_client the budget is shared by all workers; the local bucket is the fallback"""
         self.calls_per_minute = calls_per_minute
-        self.window_size = 60  # seconds
-        self.call_timestamps = deque()
+        self.rate = calls_per_minute / 60.0  # tokens per second
+        self.tokens = float(calls_per_minute)
+        self.last = time.monotonic()
+        self.lock = Lock()
         self.total_calls = 0
         self.blocked_calls = 0
+        self.shared = RedisTokenBucket(redis_client, 'finnhub', calls_per_minute, self.rate) if redis_client else None
         
-        logger.info(f"Finnhub rate limiter: {calls_per_minute} calls/min")
+        logger.info("Finnhub rate limiter: %s calls/min", calls_per_minute)
+    
+    def _refill(self, now):
+        """Top up tokens for the time elapsed since the last call (caller holds the lock)"""
+        self.tokens = min(self.calls_per_minute, self.tokens + (now - self.last) * self.rate)
+        self.last = now
     
     def can_make_call(self):
-        """Check if we can make an API call"""
-        current_time = time.time()
-        cutoff = current_time - self.window_size
-        
-        # Remove old timestamps
-        while self.call_timestamps and self.call_timestamps[0] < cutoff:
-            self.call_timestamps.popleft()
+        """Consume a token if one is available"""
+        shared = self.shared.acquire() if self.shared else None
         
-        # Check limit
-        if len(self.call_timestamps) < self.calls_per_minute:
-            self.call_timestamps.append(current_time)
-            self.total_calls += 1
-            return True
+        with self.lock:
+            self._refill(time.monotonic())
+            
+            if shared is not None:
+                allowed, self.tokens, _ = shared
+                if allowed:
+                    self.total_calls += 1
+                    return True
+            elif self.tokens >= 1:
+                self.tokens -= 1
+                self.total_calls += 1
+                return True
+            
+            self.blocked_calls += 1
+            wait_time = (1 - self.tokens) / self.rate
         
-        self.blocked_calls += 1
-        wait_time = self.call_timestamps[0] + self.window_size - current_time
-        logger.warning(f"Rate limit reached. Wait {wait_time:.1f}s")
+        logger.warning("Rate limit reached. Wait %.1fs", wait_time)
         return False
     
     def get_stats(self):
         """Get rate limiter statistics"""
-        current_time = time.time()
-        cutoff = current_time - self.window_size
-        
-        while self.call_timestamps and self.call_timestamps[0] < cutoff:
-            self.call_timestamps.popleft()
+        with self.lock:
+            self._refill(time.monotonic())
+            remaining = int(self.tokens)
         
         return {
-            'calls_this_minute': len(self.call_timestamps),
-            'remaining': self.calls_per_minute - len(self.call_timestamps),
+            'calls_this_minute': self.calls_per_minute - remaining,
+            'remaining': remaining,
             'total_calls': self.total_calls,
             'blocked_calls': self.blocked_calls
         }
@@ -1,19 +1,105 @@
 """Finnhub API service with ultra-aggressive caching"""
-import requests
 import logging
+import gevent
+import numpy as np
+import orjson
 from typing import Dict, List, Optional, Any
 from datetime import datetime, timedelta
+from gevent.pool import Pool
+from services.batch_dispatcher import BatchDispatcher
 from services.finnhub_limiter import FinnhubRateLimiter
+from services.http_session import create_session
+from services.single_flight import SingleFlight
+from services.timestamps import utc_now_iso
 
 logger = logging.getLogger(__name__)
 
-# Ultra-aggressive cache TTLs to minimize API calls
+# Cache TTLs; quotes go stale quickly but are served stale while a
+# background refresh runs, so the short TTL never blocks a request
 CACHE_TTL = {
-    'quote': 7200,      # 2 hours
+    'quote': 60,        # 1 minute; shared by every page that shows the symbol
+    'quote_stale': 143940,  # then served stale (and refreshed) for ~40 more hours
     'candles': 14400,   # 4 hours  
     'profile': 86400,   # 24 hours
+    'symbols': 86400,   # 24 hours; listings change rarely
 }
 
+# Concurrent upstream requests per get_quotes call
+QUOTE_FANOUT = 16
+
+
+def _quote_key(symbol):
+    """
+    Cache key for a symbol's quote.
+    
+    The symbol is a Redis Cluster hash tag, so all keys for one symbol land
+    on the same shard.
+    """
+    return f"finnhub:quote:{{{symbol}}}"
+
+
+def _parse_quote(data, symbol, updated_at):
+    """
+    Parse a /quote payload (c, o, h, l, pc) into the app's quote shape.
+    
+    Args:
+        data: Decoded /quote response with a non-zero current price
+        symbol: Requested symbol
+        updated_at: ISO timestamp to stamp the quote with
+        
+    Returns:
+        Quote dictionary
+    """
+    price = float(data['c'])
+    previous_close = float(data.get('pc', price))
+    change = price - previous_close
+    return {
+        'symbol': symbol.upper(),
+        'name': symbol,
+        'price': round(price, 2),
+        'change': round(change, 2),
+        'change_percent': round(change / data.get('pc', 1) * 100, 2),
+        'open': round(float(data.get('o', 0)), 2),
+        'high': round(float(data.get('h', 0)), 2),
+        'low': round(float(data.get('l', 0)), 2),
+        'previous_close': round(float(data.get('pc', 0)), 2),
+        'updated_at': updated_at,
+        'source': 'finnhub'
+    }
+
+
+def _candles_to_rows(data):
+    """
+    Convert a Finnhub candle payload (parallel o/h/l/c/v/t arrays) into rows.
+    
+    Rounding and date formatting run over whole NumPy columns; Python only
+    zips the finished columns into dicts.
+    
+    Args:
+        data: Decoded /stock/candle response with status 'ok'
+        
+    Returns:
+        List of {'date', 'open', 'high', 'low', 'close', 'volume'} dicts
+    """
+    n = len(data.get('t', []))
+    if not n:
+        return []
+    
+    dates = np.datetime_as_string(np.asarray(data['t'], dtype='datetime64[s]'), unit='D').tolist()
+    opens, highs, lows, closes = (
+        np.round(np.asarray(data[field][:n], dtype=np.float64), 2).tolist()
+        for field in ('o', 'h', 'l', 'c')
+    )
+    # Volume may be shorter than the timestamps; missing days count as 0
+    volumes = np.zeros(n, dtype=np.int64)
+    raw_volumes = data.get('v', [])[:n]
+    volumes[:len(raw_volumes)] = raw_volumes
+    
+    return [
+        {'date': d, 'open': o, 'high': h, 'low': l, 'close': c, 'volume': v}
+        for d, o, h, l, c, v in zip(dates, opens, highs, lows, closes, volumes.tolist())
+    ]
+
 
 class FinnhubService:
     """Finnhub API wrapper with aggressive caching and rate limiting"""
@@ -21,74 +107,168 @@ class FinnhubService:
     def __init__(self, api_key, cache_service=None):
         self.api_key = api_key
         self.cache = cache_service
-        self.limiter = FinnhubRateLimiter(60)
+        self.limiter = FinnhubRateLimiter(60, getattr(cache_service, 'redis_client', None))
         self.base_url = 'https://finnhub.io/api/v1'
+        self.session = create_session()
+        self.flight = SingleFlight()
+        self.batcher = BatchDispatcher(self._fetch_quotes, max_batch=QUOTE_FANOUT * 2)
         logger.info("Finnhub service initialized (60/min, cache-first)")
     
+    def close(self):
+        """Release pooled HTTP connections"""
+        self.session.close()
+    
     def get_quote(self, symbol):
-        """Get stock quote with cache-first strategy"""
-        cache_key = f"finnhub:quote:{symbol}"
+        """Get stock quote with cache-first strategy (stale quotes are served while refreshing)"""
+        cache_key = _quote_key(symbol)
         
         # ALWAYS check cache first
         if self.cache:
-            cached = self.cache.get(cache_key)
+            cached, is_stale = self.cache.get_swr(cache_key)
             if cached:
-                logger.debug(f"Cache HIT: {symbol}")
-                return cached
+                if not is_stale:
+                    logger.debug("Cache HIT: %s", symbol)
+                    return cached
+                logger.info("Stale cache: %s", symbol)
+                self._revalidate([symbol])
+                return {**cached, 'stale': True}
+        
+        # Misses from concurrent requests are fetched and cached together
+        quote = self.batcher.submit(symbol)
+        if quote:
+            return quote
+        
+        logger.error("No data for %s", symbol)
+        return None
+    
+    def get_quotes(self, symbols):
+        """
+        Get quotes for several symbols with one cache round-trip.
+        
+        Cached quotes are read with a single MGET; stale ones are served and
+        refreshed in the background. Only true misses go to the API, each on
+        its own greenlet so K misses cost roughly one upstream round-trip.
+        The rate limiter still caps how many reach the API.
+        
+        Args:
+            symbols: Stock symbols
+            
+        Returns:
+            Dict of symbol -> quote for the symbols that returned data
+        """
+        symbols = list(dict.fromkeys(symbols))
+        if not symbols:
+            return {}
         
-        # Cache miss - try API if rate limit allows
+        keys = [_quote_key(symbol) for symbol in symbols]
+        cached = self.cache.mget_swr(keys) if self.cache else [(None, False)] * len(symbols)
+        quotes = {}
+        stale = []
+        for symbol, (quote, is_stale) in zip(symbols, cached):
+            if quote:
+                quotes[symbol] = {**quote, 'stale': True} if is_stale else quote
+                if is_stale:
+                    stale.append(symbol)
+        self._revalidate(stale)
+        
+        misses = [symbol for symbol in symbols if symbol not in quotes]
+        if misses:
+            quotes.update(self._fetch_quotes(misses))
+        return quotes
+    
+    def _fetch_quotes(self, symbols):
+        """Fetch uncached quotes concurrently and cache them in one pipeline"""
+        pool = Pool(min(QUOTE_FANOUT, len(symbols)))
+        fetched = pool.map(lambda symbol: self.flight.do(_quote_key(symbol), self._fetch_quote, symbol), symbols)
+        fresh = {symbol: quote for symbol, quote in zip(symbols, fetched) if quote}
+        self._cache_quotes(fresh)
+        return fresh
+    
+    def _revalidate(self, symbols):
+        """Refresh stale quotes on background greenlets, one in flight per symbol"""
+        for symbol in symbols:
+            if not self.flight.in_flight(_quote_key(symbol)):
+                gevent.spawn(self._refresh_quote, symbol)
+    
+    def _refresh_quote(self, symbol):
+        """Fetch and cache a quote (background revalidation)"""
+        quote = self.flight.do(_quote_key(symbol), self._fetch_quote, symbol)
+        if quote:
+            self._cache_quotes({symbol: quote})
+    
+    def _fetch_quote(self, symbol):
+        """Fetch a quote from the API; None if rate limited or unavailable"""
         if not self.limiter.can_make_call():
-            # Rate limited - try stale cache
-            if self.cache:
-                stale = self.cache.get(f"{cache_key}:stale")
-                if stale:
-                    logger.info(f"Stale cache: {symbol}")
-                    stale['stale'] = True
-                    return stale
-            logger.error(f"No data for {symbol} (rate limited)")
             return None
         
-        # Make API call
         try:
             params = {'symbol': symbol, 'token': self.api_key}
-            resp = requests.get(f"{self.base_url}/quote", params=params, timeout=10)
+            resp = self.session.get(f"{self.base_url}/quote", params=params, timeout=10)
             resp.raise_for_status()
-            data = resp.json()
+            data = orjson.loads(resp.content)
             
             if not data.get('c'):
                 return None
             
-            quote = {
-                'symbol': symbol.upper(),
-                'name': symbol,
-                'price': round(float(data['c']), 2),
-                'change': round(float(data['c'] - data.get('pc', data['c'])), 2),
-                'change_percent': round(float((data['c'] - data.get('pc', data['c'])) / data.get('pc', 1) * 100), 2),
-                'open': round(float(data.get('o', 0)), 2),
-                'high': round(float(data.get('h', 0)), 2),
-                'low': round(float(data.get('l', 0)), 2),
-                'previous_close': round(float(data.get('pc', 0)), 2),
-                'updated_at': datetime.utcnow().isoformat(),
-                'source': 'finnhub'
-            }
+            return _parse_quote(data, symbol, utc_now_iso())
             
-            # Cache aggressively
-            if self.cache:
-                self.cache.set(cache_key, quote, CACHE_TTL['quote'])
-                self.cache.set(f"{cache_key}:stale", quote, CACHE_TTL['quote'] * 20)
-                logger.info(f"API call + cached: {symbol}")
+        except Exception as e:
+            logger.error("Finnhub error %s: %s", symbol, e)
+            return None
+    
+    def _cache_quotes(self, quotes):
+        """Cache fresh quotes aggressively, servable stale for a long window after"""
+        if not self.cache or not quotes:
+            return
+        
+        self.cache.mset_swr(
+            {_quote_key(symbol): quote for symbol, quote in quotes.items()},
+            CACHE_TTL['quote'],
+            CACHE_TTL['quote_stale']
+        )
+        logger.info("API call + cached: %s", list(quotes))
+    
+    def get_symbols(self, exchange='US'):
+        """
+        Get every symbol listed on an exchange (one API call per day).
+        
+        Args:
+            exchange: Finnhub exchange code
             
-            return quote
+        Returns:
+            Sorted list of symbols, empty if unavailable
+        """
+        cache_key = f"finnhub:symbols:{exchange}"
+        
+        if self.cache:
+            cached = self.cache.get(cache_key)
+            if cached:
+                return cached
+        
+        return self.flight.do(cache_key, self._fetch_symbols, exchange, cache_key)
+    
+    def _fetch_symbols(self, exchange, cache_key):
+        """Fetch an exchange's symbol listing from the API and cache it"""
+        if not self.limiter.can_make_call():
+            logger.warning("Rate limited (symbols %s)", exchange)
+            return []
+        
+        try:
+            params = {'exchange': exchange, 'token': self.api_key}
+            resp = self.session.get(f"{self.base_url}/stock/symbol", params=params, timeout=30)
+            resp.raise_for_status()
+            data = orjson.loads(resp.content)
+            
+            symbols = sorted({item['symbol'] for item in data if item.get('symbol')})
+            
+            if self.cache and symbols:
+                self.cache.set(cache_key, symbols, CACHE_TTL['symbols'])
+            
+            return symbols
             
         except Exception as e:
-            logger.error(f"Finnhub error {symbol}: {e}")
-            # Try stale cache on error
-            if self.cache:
-                stale = self.cache.get(f"{cache_key}:stale")
-                if stale:
-                    stale['stale'] = True
-                    return stale
-            return None
+            logger.error("Error getting symbols %s: %s", exchange, e)
+            return []
     
     def get_candles(self, symbol, resolution='D', from_ts=None, to_ts=None):
         """Get historical candles data"""
@@ -104,8 +284,13 @@ class FinnhubService:
             if cached:
                 return cached
         
+        # Concurrent misses for the same range share one API call
+        return self.flight.do(cache_key, self._fetch_candles, symbol, resolution, from_ts, to_ts, cache_key)
+    
+    def _fetch_candles(self, symbol, resolution, from_ts, to_ts, cache_key):
+        """Fetch candles from the API and cache them"""
         if not self.limiter.can_make_call():
-            logger.warning(f"Rate limited (historical {symbol})")
+            logger.warning("Rate limited (historical %s)", symbol)
             return []
         
         try:
@@ -117,23 +302,14 @@ class FinnhubService:
                 'token': self.api_key
             }
             
-            resp = requests.get(f"{self.base_url}/stock/candle", params=params, timeout=15)
+            resp = self.session.get(f"{self.base_url}/stock/candle", params=params, timeout=15)
             resp.raise_for_status()
-            data = resp.json()
+            data = orjson.loads(resp.content)
             
             if data.get('s') != 'ok':
                 return []
             
-            historical = []
-            for i in range(len(data.get('t', []))):
-                historical.append({
-                    'date': datetime.fromtimestamp(data['t'][i]).strftime('%Y-%m-%d'),
-                    'open': round(data['o'][i], 2),
-                    'high': round(data['h'][i], 2),
-                    'low': round(data['l'][i], 2),
-                    'close': round(data['c'][i], 2),
-                    'volume': int(data['v'][i]) if i < len(data.get('v', [])) else 0
-                })
+            historical = _candles_to_rows(data)
             
             if self.cache and historical:
                 self.cache.set(cache_key, historical, CACHE_TTL['candles'])
@@ -141,5 +317,5 @@ class FinnhubService:
             return historical
             
         except Exception as e:
-            logger.error(f"Error getting candles {symbol}: {e}")
+            logger.error("Error getting candles %s: %s", symbol, e)
             return []
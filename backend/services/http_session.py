@@ -0,0 +1,35 @@
+"""Shared HTTP session factory for the market data providers."""
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+def create_session(pool_connections: int = 10, pool_maxsize: int = 32) -> requests.Session:
+    """
+    Build a keep-alive session with a pooled HTTPS adapter.
+    
+    Connections to the provider host are reused across calls, so a cache
+    miss does not pay a fresh TCP + TLS handshake. Transient upstream
+    failures (429/5xx) are retried twice with a short backoff.
+    
+    Args:
+        pool_connections: Number of per-host pools to keep
+        pool_maxsize: Maximum connections kept open per host
+        
+    Returns:
+        Configured requests session
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=pool_connections,
+        pool_maxsize=pool_maxsize,
+        max_retries=Retry(
+            total=2,
+            backoff_factor=0.2,
+            status_forcelist=[429, 500, 502, 503, 504],
+            allowed_methods=frozenset(['GET'])
+        )
+    )
+    session.mount('https://', adapter)
+    session.headers['Connection'] = 'keep-alive'
+    return session
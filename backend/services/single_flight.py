@@ -0,0 +1,63 @@
+"""Per-key request coalescing for cache-miss fetches."""
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict
+
+
+class SingleFlight:
+    """
+    Collapse concurrent calls for the same key into one execution.
+    
+    The first caller for a key (the leader) runs the function; callers that
+    arrive while it is in flight wait for and share its result instead of
+    repeating the upstream request. Nothing is remembered once the call
+    finishes - caching stays the caller's job.
+    """
+    
+    def __init__(self, timeout: float = 30):
+        """
+        Initialize the coalescer.
+        
+        Args:
+            timeout: Seconds a waiting caller blocks for the leader's result
+        """
+        self.timeout = timeout
+        self._calls: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+    
+    def in_flight(self, key: str) -> bool:
+        """Whether a call for key is currently running."""
+        return key in self._calls
+    
+    def do(self, key: str, func: Callable[..., Any], *args: Any) -> Any:
+        """
+        Run func(*args) once per key across concurrent callers.
+        
+        Args:
+            key: Identity of the work, usually its cache key
+            func: Function performing the fetch
+            args: Arguments for func
+            
+        Returns:
+            The leader's result; the leader's exception is re-raised in
+            every waiting caller
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+        
+        if not leader:
+            return future.result(timeout=self.timeout)
+        
+        try:
+            result = func(*args)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
@@ -1,10 +1,24 @@
 """Stock data service - Finnhub PRIMARY + Alpha Vantage for historical ONLY"""
+import heapq
 import logging
+import time
+from operator import itemgetter
 from typing import Dict, List, Optional, Any
-from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
+# Calendar days covered by each history period (unknown periods get a year)
+_PERIOD_DAYS = {'1d': 1, '5d': 5, '1mo': 30, '3mo': 90, '6mo': 180, '1y': 365, '2y': 730}
+_PERIOD_SECS = {period: days * 86400 for period, days in _PERIOD_DAYS.items()}
+
+# Seconds between re-reads of the (daily) listed-symbol cache
+_SYMBOL_SET_REFRESH = 3600
+
+# Popular stocks the top movers are picked from
+_MOVER_SYMBOLS = ('AAPL', 'MSFT', 'GOOGL', 'AMZN', 'TSLA', 'META', 'NVDA', 'AMD', 'NFLX', 'DIS',
+                  'PYPL', 'INTC', 'CSCO', 'ADBE', 'CRM', 'ORCL')
+_change_percent = itemgetter('change_percent')
+
 
 class StockDataService:
     """Service for fetching stock market data using Finnhub + Alpha Vantage (historical only)"""
@@ -15,6 +29,8 @@ class StockDataService:
         self.cache_service = cache_service
         self.finnhub_key = self.config.get('FINNHUB_API_KEY', '')
         self.alpha_vantage_key = self.config.get('ALPHA_VANTAGE_API_KEY', '')
+        # (loaded_at, symbols), swapped as one tuple so readers never lock
+        self._valid_symbols = (float('-inf'), frozenset())
         
         # Initialize Finnhub (PRIMARY for quotes)
         self.finnhub = None
@@ -41,17 +57,48 @@ class StockDataService:
     def get_quote(self, symbol: str) -> Optional[Dict[str, Any]]:
         """Get quote - FINNHUB ONLY"""
         if not self.finnhub:
-            logger.error(f"❌ No Finnhub: {symbol}")
+            logger.error("❌ No Finnhub: %s", symbol)
             return None
         try:
             quote = self.finnhub.get_quote(symbol)
             if quote:
-                logger.debug(f"✅ Finnhub quote: {symbol}")
+                logger.debug("✅ Finnhub quote: %s", symbol)
             return quote
         except Exception as e:
-            logger.error(f"❌ Quote error {symbol}: {e}")
+            logger.error("❌ Quote error %s: %s", symbol, e)
             return None
     
+    def get_quotes(self, symbols: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Get quotes for several symbols in one concurrent batch - FINNHUB ONLY"""
+        if not self.finnhub:
+            logger.error("❌ No Finnhub: %s", symbols)
+            return {}
+        try:
+            return self.finnhub.get_quotes(symbols)
+        except Exception as e:
+            logger.error("❌ Quotes error %s: %s", symbols, e)
+            return {}
+    
+    def warm_quotes(self, symbols: List[str], batch_size: int = 100) -> int:
+        """
+        Prime the quote cache for many symbols, e.g. from a scheduled job.
+        
+        Symbols are processed in batches: each batch reads the cache with one
+        MGET and writes fetched quotes back in one pipeline.
+        
+        Args:
+            symbols: Stock symbols to warm
+            batch_size: Symbols per cache round-trip
+            
+        Returns:
+            Number of symbols with a cached quote afterwards
+        """
+        warmed = 0
+        for start in range(0, len(symbols), batch_size):
+            warmed += len(self.get_quotes(symbols[start:start + batch_size]))
+        logger.info("Warmed %s/%s quotes", warmed, len(symbols))
+        return warmed
+    
     def get_historical_data(self, symbol: str, period: str = '1y', interval: str = '1d') -> List[Dict[str, Any]]:
         """
         Get historical data - Finnhub FIRST, Alpha Vantage FALLBACK
@@ -64,42 +111,38 @@ class StockDataService:
         # Try Finnhub first (FREE tier, 60 calls/min)
         if self.finnhub:
             try:
-                from datetime import datetime, timedelta
-                days = {'1d': 1, '5d': 5, '1mo': 30, '3mo': 90, '6mo': 180, '1y': 365, '2y': 730}.get(period, 365)
-                to_ts = int(datetime.now().timestamp())
-                from_ts = int((datetime.now() - timedelta(days=days)).timestamp())
+                to_ts = int(time.time())
+                from_ts = to_ts - _PERIOD_SECS.get(period, 365 * 86400)
                 
                 data = self.finnhub.get_candles(symbol, 'D', from_ts, to_ts)
                 
                 if data and len(data) > 0:
-                    logger.info(f"✅ Finnhub historical {symbol}: {len(data)} records")
+                    logger.info("✅ Finnhub historical %s: %s records", symbol, len(data))
                     return data
                 else:
-                    logger.debug(f"⚠️ Finnhub no data for {symbol}, trying Alpha Vantage...")
+                    logger.debug("⚠️ Finnhub no data for %s, trying Alpha Vantage...", symbol)
             except Exception as e:
-                logger.warning(f"Finnhub historical error {symbol}: {e}")
+                logger.warning("Finnhub historical error %s: %s", symbol, e)
         
         # Fallback to Alpha Vantage for historical (ONLY if Finnhub fails)
         if self.alpha_vantage:
             try:
-                # Determine output size based on period
-                outputsize = 'full' if period in ['1y', '2y', '5y'] else 'compact'
+                # Compact (last 100 trading days) covers periods up to 100
+                # calendar days; anything longer needs the full series
+                days = None if period == 'full' else _PERIOD_DAYS.get(period, 365)
+                outputsize = 'compact' if days is not None and days <= 100 else 'full'
                 
-                data = self.alpha_vantage.get_historical_data(symbol, outputsize)
+                data = self.alpha_vantage.get_historical_data(symbol, outputsize, days=days)
                 
                 if data and len(data) > 0:
-                    logger.info(f"✅ Alpha Vantage historical {symbol}: {len(data)} records")
-                    # Limit to requested period
-                    if period != 'full':
-                        days = {'1d': 1, '5d': 5, '1mo': 30, '3mo': 90, '6mo': 180, '1y': 365, '2y': 730}.get(period, 365)
-                        data = data[:days]
+                    logger.info("✅ Alpha Vantage historical %s: %s records", symbol, len(data))
                     return data
                 else:
-                    logger.warning(f"⚠️ No Alpha Vantage data for {symbol}")
+                    logger.warning("⚠️ No Alpha Vantage data for %s", symbol)
             except Exception as e:
-                logger.error(f"❌ Alpha Vantage error {symbol}: {e}")
+                logger.error("❌ Alpha Vantage error %s: %s", symbol, e)
         
-        logger.error(f"❌ No historical data available for {symbol}")
+        logger.error("❌ No historical data available for %s", symbol)
         return []
     
     def get_company_info(self, symbol: str):
@@ -107,74 +150,64 @@ class StockDataService:
         return None
     
     def get_market_indices(self) -> List[Dict[str, Any]]:
-        """Get market indices with caching"""
-        cache_key = "market:indices:full"
-        if self.cache_service:
-            cached = self.cache_service.get(cache_key)
-            if cached:
-                logger.debug("✅ Market indices from cache")
-                return cached
-        
-        logger.info("Fetching fresh market indices...")
+        """Get market indices (built from the short-TTL per-symbol quote cache)"""
         symbols = {'AAPL': 'Apple Inc.', 'MSFT': 'Microsoft Corp.', 'GOOGL': 'Alphabet Inc.', 'AMZN': 'Amazon.com Inc.'}
         
+        quotes = self.get_quotes(list(symbols))
         indices = []
         for symbol, name in symbols.items():
-            quote = self.get_quote(symbol)
+            quote = quotes.get(symbol)
             if quote:
-                quote['name'] = name
-                quote['category'] = 'market_leader'
-                indices.append(quote)
-        
-        if self.cache_service and indices:
-            self.cache_service.set(cache_key, indices, 3600)
-            logger.info(f"Cached {len(indices)} indices (1hr)")
+                # Copy: quotes may be shared with the in-process cache
+                indices.append({**quote, 'name': name, 'category': 'market_leader'})
         
         return indices
     
     def get_top_gainers_losers(self, market: str = 'US', limit: int = 10) -> Dict[str, List[Dict[str, Any]]]:
         """Get top movers - uses cached quotes from popular stocks"""
         try:
-            # Check cache first (1 hour TTL)
-            cache_key = f"market:movers:{market}:{limit}"
-            if self.cache_service:
-                cached = self.cache_service.get(cache_key)
-                if cached:
-                    logger.debug("✅ Top movers from cache")
-                    return cached
-            
-            logger.info("Calculating top movers...")
-            symbols = ['AAPL', 'MSFT', 'GOOGL', 'AMZN', 'TSLA', 'META', 'NVDA', 'AMD', 'NFLX', 'DIS', 
-                      'PYPL', 'INTC', 'CSCO', 'ADBE', 'CRM', 'ORCL']
-            
-            stocks = []
-            for symbol in symbols[:limit * 3]:  # Fetch 3x to ensure enough data
-                quote = self.get_quote(symbol)
-                if quote and quote.get('change_percent') is not None:
-                    stocks.append(quote)
-            
-            stocks.sort(key=lambda x: x['change_percent'], reverse=True)
-            gainers = [s for s in stocks if s['change_percent'] > 0][:limit]
-            losers = [s for s in stocks if s['change_percent'] < 0][-limit:]
-            losers.reverse()
+            quotes = self.get_quotes(_MOVER_SYMBOLS[:limit * 3])  # Fetch 3x to ensure enough data
+            stocks = [q for q in quotes.values() if q.get('change_percent') is not None]
             
-            result = {'gainers': gainers, 'losers': losers}
+            # Partial selection: only the top `limit` of each side get ordered
+            gainers = heapq.nlargest(limit, (s for s in stocks if s['change_percent'] > 0), key=_change_percent)
+            losers = heapq.nsmallest(limit, (s for s in stocks if s['change_percent'] < 0), key=_change_percent)
             
-            # Cache for 1 hour
-            if self.cache_service:
-                self.cache_service.set(cache_key, result, 3600)
-                logger.info(f"Cached top movers (1hr): {len(gainers)} gainers, {len(losers)} losers")
-            
-            return result
+            return {'gainers': gainers, 'losers': losers}
         except Exception as e:
-            logger.error(f"Error getting movers: {e}")
+            logger.error("Error getting movers: %s", e)
             return {'gainers': [], 'losers': []}
     
+    def close(self):
+        """Release provider HTTP connections"""
+        for provider in (self.finnhub, self.alpha_vantage):
+            if provider:
+                provider.close()
+    
+    def _symbol_set(self) -> frozenset:
+        """US listed symbols, re-read from the shared daily cache hourly"""
+        loaded_at, symbols = self._valid_symbols
+        if time.monotonic() - loaded_at < _SYMBOL_SET_REFRESH:
+            return symbols
+        
+        listing = self.finnhub.get_symbols('US')
+        if listing:
+            symbols = frozenset(listing)
+            self._valid_symbols = (time.monotonic(), symbols)
+        else:
+            # Keep the previous set and retry in a minute
+            self._valid_symbols = (time.monotonic() - _SYMBOL_SET_REFRESH + 60, symbols)
+        return symbols
+    
     def validate_symbol(self, symbol: str) -> bool:
-        """Validate symbol"""
+        """Validate symbol against the exchange listing (quote lookup if unavailable)"""
         if not self.finnhub:
             return False
         try:
+            symbols = self._symbol_set()
+            if symbols:
+                return symbol.upper() in symbols
+            
             quote = self.finnhub.get_quote(symbol)
             return quote is not None
         except:
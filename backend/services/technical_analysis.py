@@ -1,17 +1,52 @@
 """Technical analysis service for calculating indicators."""
-import pandas as pd
+import math
 import numpy as np
-from typing import Dict, List, Any, Optional
+from scipy.signal import lfilter
+from typing import Dict, List, Any, Optional, Sequence, Tuple, Union
 import logging
 
 logger = logging.getLogger(__name__)
 
+PriceSeries = Union[Sequence[float], np.ndarray]
+
+
+def _as_array(values: PriceSeries) -> np.ndarray:
+    """Return values as a float64 array without copying existing arrays."""
+    return np.asarray(values, dtype=np.float64)
+
+
+def _ema_series(values: np.ndarray, period: int) -> np.ndarray:
+    """
+    Exponential moving average over the whole series.
+    
+    Runs the recurrence ``e[i] = a*x[i] + (1-a)*e[i-1]`` (seeded with
+    ``e[0] = x[0]``, matching ``pandas.ewm(span=period, adjust=False)``)
+    as a single IIR filter in C.
+    """
+    alpha = 2.0 / (period + 1)
+    ema, _ = lfilter([alpha], [1.0, alpha - 1.0], values, zi=[(1.0 - alpha) * values[0]])
+    return ema
+
+
+def _mean_std(window: np.ndarray) -> Tuple[float, float]:
+    """
+    Mean and population standard deviation of a short window.
+    
+    Both come from the running sum and sum of squares, so the window is
+    reduced once per moment instead of mean() then std() re-centring it.
+    Fine for indicator-sized windows; long windows want Welford's method.
+    """
+    n = window.size
+    mean = window.sum() / n
+    var = np.dot(window, window) / n - mean * mean
+    return mean, math.sqrt(max(var, 0.0))
+
 
 class TechnicalAnalysisService:
     """Service for calculating technical indicators."""
     
     @staticmethod
-    def calculate_sma(prices: List[float], period: int) -> Optional[float]:
+    def calculate_sma(prices: PriceSeries, period: int) -> Optional[float]:
         """
         Calculate Simple Moving Average.
         
@@ -25,10 +60,10 @@ class TechnicalAnalysisService:
         if len(prices) < period:
             return None
         
-        return np.mean(prices[-period:])
+        return float(_as_array(prices)[-period:].mean())
     
     @staticmethod
-    def calculate_ema(prices: List[float], period: int) -> Optional[float]:
+    def calculate_ema(prices: PriceSeries, period: int) -> Optional[float]:
         """
         Calculate Exponential Moving Average.
         
@@ -42,12 +77,10 @@ class TechnicalAnalysisService:
         if len(prices) < period:
             return None
         
-        df = pd.DataFrame({'price': prices})
-        ema = df['price'].ewm(span=period, adjust=False).mean()
-        return float(ema.iloc[-1])
+        return float(_ema_series(_as_array(prices), period)[-1])
     
     @staticmethod
-    def calculate_rsi(prices: List[float], period: int = 14) -> Optional[float]:
+    def calculate_rsi(prices: PriceSeries, period: int = 14) -> Optional[float]:
         """
         Calculate Relative Strength Index.
         
@@ -61,16 +94,12 @@ class TechnicalAnalysisService:
         if len(prices) < period + 1:
             return None
         
-        # Calculate price changes
-        deltas = np.diff(prices)
+        # Only the last period changes matter; diff just that tail
+        deltas = np.diff(_as_array(prices)[-(period + 1):])
         
-        # Separate gains and losses
-        gains = np.where(deltas > 0, deltas, 0)
-        losses = np.where(deltas < 0, -deltas, 0)
-        
-        # Calculate average gains and losses
-        avg_gain = np.mean(gains[-period:])
-        avg_loss = np.mean(losses[-period:])
+        # Average gains and losses over the period
+        avg_gain = deltas.clip(min=0.0).sum() / period
+        avg_loss = -deltas.clip(max=0.0).sum() / period
         
         if avg_loss == 0:
             return 100.0
@@ -82,7 +111,7 @@ class TechnicalAnalysisService:
     
     @staticmethod
     def calculate_macd(
-        prices: List[float],
+        prices: PriceSeries,
         fast_period: int = 12,
         slow_period: int = 26,
         signal_period: int = 9
@@ -102,30 +131,45 @@ class TechnicalAnalysisService:
         if len(prices) < slow_period:
             return None
         
-        df = pd.DataFrame({'price': prices})
+        prices = _as_array(prices)
         
         # Calculate EMAs
-        ema_fast = df['price'].ewm(span=fast_period, adjust=False).mean()
-        ema_slow = df['price'].ewm(span=slow_period, adjust=False).mean()
+        ema_fast = _ema_series(prices, fast_period)
+        ema_slow = _ema_series(prices, slow_period)
+        
+        return TechnicalAnalysisService._macd_from_emas(ema_fast, ema_slow, signal_period)
+    
+    @staticmethod
+    def _macd_from_emas(ema_fast: np.ndarray, ema_slow: np.ndarray, signal_period: int) -> Dict[str, float]:
+        """
+        MACD values from already-computed fast and slow EMA series.
         
+        Args:
+            ema_fast: Fast EMA series
+            ema_slow: Slow EMA series
+            signal_period: Signal line period
+            
+        Returns:
+            Dictionary with macd, signal, and histogram values
+        """
         # Calculate MACD line
         macd_line = ema_fast - ema_slow
         
         # Calculate signal line
-        signal_line = macd_line.ewm(span=signal_period, adjust=False).mean()
+        signal_line = _ema_series(macd_line, signal_period)
         
         # Calculate histogram
-        histogram = macd_line - signal_line
+        histogram = macd_line[-1] - signal_line[-1]
         
         return {
-            'macd': round(float(macd_line.iloc[-1]), 2),
-            'signal': round(float(signal_line.iloc[-1]), 2),
-            'histogram': round(float(histogram.iloc[-1]), 2)
+            'macd': round(float(macd_line[-1]), 2),
+            'signal': round(float(signal_line[-1]), 2),
+            'histogram': round(float(histogram), 2)
         }
     
     @staticmethod
     def calculate_bollinger_bands(
-        prices: List[float],
+        prices: PriceSeries,
         period: int = 20,
         std_dev: float = 2.0
     ) -> Optional[Dict[str, float]]:
@@ -143,11 +187,8 @@ class TechnicalAnalysisService:
         if len(prices) < period:
             return None
         
-        # Calculate SMA (middle band)
-        sma = np.mean(prices[-period:])
-        
-        # Calculate standard deviation
-        std = np.std(prices[-period:])
+        # SMA (middle band) and standard deviation from one set of sums
+        sma, std = _mean_std(_as_array(prices)[-period:])
         
         # Calculate bands
         upper_band = sma + (std_dev * std)
@@ -161,9 +202,9 @@ class TechnicalAnalysisService:
     
     @staticmethod
     def calculate_atr(
-        high: List[float],
-        low: List[float],
-        close: List[float],
+        high: PriceSeries,
+        low: PriceSeries,
+        close: PriceSeries,
         period: int = 14
     ) -> Optional[float]:
         """
@@ -181,24 +222,26 @@ class TechnicalAnalysisService:
         if len(high) < period + 1 or len(low) < period + 1 or len(close) < period + 1:
             return None
         
-        # Calculate True Range
-        tr_list = []
-        for i in range(1, len(close)):
-            tr1 = high[i] - low[i]
-            tr2 = abs(high[i] - close[i - 1])
-            tr3 = abs(low[i] - close[i - 1])
-            tr = max(tr1, tr2, tr3)
-            tr_list.append(tr)
+        high = _as_array(high)
+        low = _as_array(low)
+        close = _as_array(close)
+        n = min(len(high), len(low), len(close))
+        high, low, close = high[:n], low[:n], close[:n]
         
-        # Calculate ATR as average of TR over period
-        if len(tr_list) < period:
-            return None
+        # Calculate True Range for every bar after the first
+        prev_close = close[:-1]
+        true_range = np.maximum.reduce([
+            high[1:] - low[1:],
+            np.abs(high[1:] - prev_close),
+            np.abs(low[1:] - prev_close)
+        ])
         
-        atr = np.mean(tr_list[-period:])
+        # Calculate ATR as average of TR over period
+        atr = true_range[-period:].mean()
         return round(float(atr), 2)
     
     @staticmethod
-    def identify_trend(prices: List[float], sma_short: int = 20, sma_long: int = 50) -> str:
+    def identify_trend(prices: PriceSeries, sma_short: int = 20, sma_long: int = 50) -> str:
         """
         Identify price trend based on moving averages.
         
@@ -216,6 +259,20 @@ class TechnicalAnalysisService:
         sma_short_val = TechnicalAnalysisService.calculate_sma(prices, sma_short)
         sma_long_val = TechnicalAnalysisService.calculate_sma(prices, sma_long)
         
+        return TechnicalAnalysisService._trend_from_smas(sma_short_val, sma_long_val)
+    
+    @staticmethod
+    def _trend_from_smas(sma_short_val: Optional[float], sma_long_val: Optional[float]) -> str:
+        """
+        Classify the trend from a short and a long SMA value.
+        
+        Args:
+            sma_short_val: Short-term SMA (None if unavailable)
+            sma_long_val: Long-term SMA (None if unavailable)
+            
+        Returns:
+            Trend string: 'BULLISH', 'BEARISH', or 'NEUTRAL'
+        """
         if sma_short_val is None or sma_long_val is None:
             return 'NEUTRAL'
         
@@ -240,39 +297,48 @@ class TechnicalAnalysisService:
         if not price_data:
             return {}
         
-        # Extract price arrays
-        closes = [d['close'] for d in price_data]
-        highs = [d['high'] for d in price_data]
-        lows = [d['low'] for d in price_data]
+        # Extract price arrays once; every indicator works on these views
+        count = len(price_data)
+        closes = np.fromiter((d['close'] for d in price_data), dtype=np.float64, count=count)
+        highs = np.fromiter((d['high'] for d in price_data), dtype=np.float64, count=count)
+        lows = np.fromiter((d['low'] for d in price_data), dtype=np.float64, count=count)
         
         indicators = {}
         
+        # EMA series are shared by the EMA fields and MACD
+        emas = {}
+        
+        def ema(span):
+            if span not in emas:
+                emas[span] = _ema_series(closes, span)
+            return emas[span]
+        
         # Moving Averages
         indicators['sma_20'] = TechnicalAnalysisService.calculate_sma(closes, 20)
         indicators['sma_50'] = TechnicalAnalysisService.calculate_sma(closes, 50)
         indicators['sma_200'] = TechnicalAnalysisService.calculate_sma(closes, 200)
-        indicators['ema_12'] = TechnicalAnalysisService.calculate_ema(closes, 12)
-        indicators['ema_26'] = TechnicalAnalysisService.calculate_ema(closes, 26)
+        indicators['ema_12'] = float(ema(12)[-1]) if count >= 12 else None
+        indicators['ema_26'] = float(ema(26)[-1]) if count >= 26 else None
         
         # RSI
         indicators['rsi_14'] = TechnicalAnalysisService.calculate_rsi(closes, 14)
         
         # MACD
-        macd_data = TechnicalAnalysisService.calculate_macd(closes)
-        if macd_data:
-            indicators.update(macd_data)
+        if count >= 26:
+            indicators.update(TechnicalAnalysisService._macd_from_emas(ema(12), ema(26), 9))
         
-        # Bollinger Bands
-        bb_data = TechnicalAnalysisService.calculate_bollinger_bands(closes)
-        if bb_data:
-            indicators['bb_upper'] = bb_data['upper']
-            indicators['bb_middle'] = bb_data['middle']
-            indicators['bb_lower'] = bb_data['lower']
+        # Bollinger Bands (middle band is the 20-day SMA computed above)
+        if indicators['sma_20'] is not None:
+            sma = indicators['sma_20']
+            _, std = _mean_std(closes[-20:])
+            indicators['bb_upper'] = round(float(sma + 2.0 * std), 2)
+            indicators['bb_middle'] = round(float(sma), 2)
+            indicators['bb_lower'] = round(float(sma - 2.0 * std), 2)
         
         # ATR
         indicators['atr_14'] = TechnicalAnalysisService.calculate_atr(highs, lows, closes, 14)
         
-        # Trend
-        indicators['trend'] = TechnicalAnalysisService.identify_trend(closes)
+        # Trend (20/50-day SMAs computed above)
+        indicators['trend'] = TechnicalAnalysisService._trend_from_smas(indicators['sma_20'], indicators['sma_50'])
         
         return indicators
@@ -0,0 +1,27 @@
+"""Cheap timestamps for stamping fetched market data."""
+import time
+from datetime import datetime, timezone
+
+# (epoch second, ISO string) for the most recent second; replaced as a
+# single tuple so readers never see a mismatched pair
+_cached = (0, '')
+
+
+def utc_now_iso() -> str:
+    """
+    Current UTC time as a naive ISO-8601 string at second resolution.
+    
+    The formatted string is reused for every call within the same second,
+    so stamping a batch of quotes costs an int compare per quote instead of
+    building and formatting a datetime each time.
+    
+    Returns:
+        Timestamp like '2024-01-31T14:05:09'
+    """
+    global _cached
+    now = int(time.time())
+    second, iso = _cached
+    if second != now:
+        iso = datetime.fromtimestamp(now, timezone.utc).replace(tzinfo=None).isoformat()
+        _cached = (now, iso)
+    return iso
@@ -0,0 +1,138 @@
+"""Token bucket shared by every worker process through Redis."""
+import logging
+from typing import List, Optional, Tuple
+
+import redis
+
+logger = logging.getLogger(__name__)
+
+# Refill and take one token atomically. Time comes from the Redis server so
+# workers on different hosts agree on it. With a daily key, a token is only
+# taken while the day's counter is below the limit. Nothing is taken while
+# the bucket's 'blocked_until' (set by _BACKOFF_LUA) is in the future.
+#
+# KEYS[1] bucket hash, KEYS[2] optional daily counter
+# ARGV[1] refill rate (tokens/s), ARGV[2] capacity, ARGV[3] daily limit
+# Returns {allowed (0/1), tokens left (string), calls today}
+_ACQUIRE_LUA = """
+redis.replicate_commands()
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'last', 'blocked_until')
+local tokens = tonumber(state[1]) or capacity
+local last = tonumber(state[2]) or now
+local blocked_until = tonumber(state[3]) or 0
+if now < blocked_until then
+    return {0, '0', tonumber(KEYS[2] and redis.call('GET', KEYS[2]) or '0')}
+end
+tokens = math.min(capacity, tokens + math.max(0, now - last) * rate)
+
+local daily = 0
+if KEYS[2] then
+    daily = tonumber(redis.call('GET', KEYS[2]) or '0')
+end
+
+local allowed = 0
+if tokens >= 1 and (not KEYS[2] or daily < tonumber(ARGV[3])) then
+    tokens = tokens - 1
+    allowed = 1
+    if KEYS[2] then
+        daily = redis.call('INCR', KEYS[2])
+        redis.call('EXPIRE', KEYS[2], 172800)
+    end
+end
+
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'last', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) * 2)
+return {allowed, tostring(tokens), daily}
+"""
+
+# Empty the bucket and refuse every acquire for ARGV[1] seconds; refill
+# resumes from zero once the block ends.
+#
+# KEYS[1] bucket hash
+_BACKOFF_LUA = """
+redis.replicate_commands()
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local seconds = tonumber(ARGV[1])
+local blocked_until = math.max(now + seconds, tonumber(redis.call('HGET', KEYS[1], 'blocked_until')) or 0)
+
+redis.call('HSET', KEYS[1], 'tokens', '0', 'last', tostring(blocked_until), 'blocked_until', tostring(blocked_until))
+redis.call('EXPIRE', KEYS[1], math.max(redis.call('TTL', KEYS[1]), math.ceil(blocked_until - now) * 2))
+return 1
+"""
+
+
+class RedisTokenBucket:
+    """
+    Continuous-refill token bucket whose state lives in Redis.
+    
+    Every worker that builds a bucket with the same name draws from one
+    budget, so N gunicorn workers together stay within a provider's limit.
+    """
+    
+    def __init__(self, redis_client: redis.Redis, name: str, capacity: int, rate: float):
+        """
+        Initialize the bucket.
+        
+        Args:
+            redis_client: Shared Redis client
+            name: Bucket name, e.g. 'av'; used as the key's hash tag
+            capacity: Maximum burst size
+            rate: Tokens added per second
+        """
+        self.name = name
+        self.capacity = capacity
+        self.rate = rate
+        self._script = redis_client.register_script(_ACQUIRE_LUA)
+        self._backoff_script = redis_client.register_script(_BACKOFF_LUA)
+    
+    @property
+    def key(self) -> str:
+        """Bucket hash key; the name is a hash tag so related keys share a slot."""
+        return f"rl:{{{self.name}}}"
+    
+    def acquire(self, day: Optional[str] = None, daily_limit: int = 0) -> Optional[Tuple[bool, float, int]]:
+        """
+        Try to take one token.
+        
+        Args:
+            day: Date string keying a per-day counter, or None for no daily cap
+            daily_limit: Calls allowed per day when day is given
+            
+        Returns:
+            (allowed, tokens left, calls today), or None if Redis is
+            unavailable and the caller should fall back to a local limit
+        """
+        # Hash tag keeps the bucket and its daily counter in one cluster slot
+        keys: List[str] = [self.key]
+        if day:
+            keys.append(f"{self.key}:day:{day}")
+        
+        try:
+            allowed, tokens, daily = self._script(keys=keys, args=[self.rate, self.capacity, daily_limit])
+            return bool(allowed), float(tokens), int(daily)
+        except Exception as e:
+            logger.error("Shared rate limiter %s unavailable: %s", self.name, e)
+            return None
+    
+    def backoff(self, seconds: float) -> bool:
+        """
+        Empty the bucket and block it for every worker.
+        
+        Args:
+            seconds: How long acquire() refuses tokens
+            
+        Returns:
+            True if the block was stored, False if Redis is unavailable
+        """
+        try:
+            self._backoff_script(keys=[self.key], args=[seconds])
+            return True
+        except Exception as e:
+            logger.error("Shared rate limiter %s backoff failed: %s", self.name, e)
+            return False
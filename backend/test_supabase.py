@@ -9,6 +9,7 @@ import os
 # Add parent directory to path
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
+from sqlalchemy import func, select
 from app import create_app
 from models import db, User, Portfolio, Watchlist
 
@@ -31,9 +32,13 @@ def test_supabase_connection():
             
             # Test query
             print("\n🔄 Testing database query...")
-            user_count = User.query.count()
-            portfolio_count = Portfolio.query.count()
-            watchlist_count = Watchlist.query.count()
+            # All three counts in one round-trip
+            user_count, portfolio_count, watchlist_count = db.session.execute(
+                select(*(
+                    select(func.count()).select_from(model).scalar_subquery()
+                    for model in (User, Portfolio, Watchlist)
+                ))
+            ).one()
             
             print(f"✅ Query successful!")
             print(f"   📊 Users: {user_count}")
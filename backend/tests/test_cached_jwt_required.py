@@ -0,0 +1,73 @@
+"""Tests for the cached_jwt_required decorator."""
+import unittest
+from unittest import mock
+from flask import Flask, jsonify
+from flask_jwt_extended import JWTManager, create_access_token, get_current_user, get_jwt_identity
+from api import utils
+from api.utils import cached_jwt_required
+
+
+def _make_app():
+    """App with the production cookie settings, a user lookup and a blocklist."""
+    app = Flask(__name__)
+    app.config.update(
+        JWT_SECRET_KEY='test-secret',
+        JWT_TOKEN_LOCATION=['cookies'],
+        JWT_COOKIE_CSRF_PROTECT=False,
+    )
+    jwt = JWTManager(app)
+    app.revoked = set()
+    
+    @jwt.user_lookup_loader
+    def load_user(jwt_header, jwt_data):
+        return {'id': jwt_data['sub']}
+    
+    @jwt.token_in_blocklist_loader
+    def is_revoked(jwt_header, jwt_data):
+        return jwt_data['jti'] in app.revoked
+    
+    @app.route('/me')
+    @cached_jwt_required()
+    def me():
+        return jsonify({'identity': get_jwt_identity(), 'user': get_current_user()})
+    
+    return app
+
+
+class CachedJwtRequiredTest(unittest.TestCase):
+    
+    def setUp(self):
+        utils._verified_tokens.clear()
+        self.app = _make_app()
+        self.client = self.app.test_client()
+        with self.app.app_context():
+            self.token = create_access_token(identity='42')
+        self.client.set_cookie('access_token_cookie', self.token)
+    
+    def test_cache_hit_restores_identity_and_user(self):
+        first = self.client.get('/me')
+        self.assertEqual(first.status_code, 200)
+        
+        # A second request must not verify the signature again
+        with mock.patch.object(utils, 'verify_jwt_in_request', side_effect=AssertionError('re-verified')):
+            second = self.client.get('/me')
+        
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.get_json(), {'identity': '42', 'user': {'id': '42'}})
+    
+    def test_cache_hit_still_checks_blocklist(self):
+        self.assertEqual(self.client.get('/me').status_code, 200)
+        
+        with self.app.app_context():
+            from flask_jwt_extended import decode_token
+            self.app.revoked.add(decode_token(self.token)['jti'])
+        
+        self.assertEqual(self.client.get('/me').status_code, 401)
+    
+    def test_missing_token_is_rejected(self):
+        self.client.delete_cookie('access_token_cookie')
+        self.assertEqual(self.client.get('/me').status_code, 401)
+
+
+if __name__ == '__main__':
+    unittest.main()
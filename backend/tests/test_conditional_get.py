@@ -0,0 +1,79 @@
+"""Tests for the conditional_get decorator."""
+import unittest
+from flask import Flask, jsonify
+from flask_compress import Compress
+from api.utils import conditional_get
+
+
+class _DictCache:
+    """In-memory stand-in for CacheService.get/set."""
+    
+    def __init__(self):
+        self.data = {}
+    
+    def get(self, key):
+        return self.data.get(key)
+    
+    def set(self, key, value, timeout=None):
+        self.data[key] = value
+        return True
+
+
+def _make_app(cache_service=None):
+    """App with the production compression settings and one large route."""
+    app = Flask(__name__)
+    app.config.update(COMPRESS_ALGORITHM=['br', 'gzip'], COMPRESS_MIN_SIZE=512)
+    Compress(app)
+    if cache_service:
+        app.extensions['cache_service'] = cache_service
+    app.view_calls = 0
+    
+    @app.route('/rows')
+    @conditional_get(max_age=60)
+    def rows():
+        app.view_calls += 1
+        return jsonify([{'date': f'2024-01-{d:02d}', 'close': 100.0 + d} for d in range(1, 31)])
+    
+    return app
+
+
+class ConditionalGetTest(unittest.TestCase):
+    
+    def test_plain_revalidation_returns_304(self):
+        client = _make_app().test_client()
+        first = client.get('/rows')
+        self.assertEqual(first.status_code, 200)
+        
+        second = client.get('/rows', headers={'If-None-Match': first.headers['ETag']})
+        self.assertEqual(second.status_code, 304)
+        self.assertEqual(second.get_data(), b'')
+    
+    def test_compressed_revalidation_returns_304(self):
+        client = _make_app().test_client()
+        headers = {'Accept-Encoding': 'gzip'}
+        first = client.get('/rows', headers=headers)
+        self.assertEqual(first.headers['Content-Encoding'], 'gzip')
+        self.assertTrue(first.headers['ETag'].endswith(':gzip"'))
+        
+        second = client.get('/rows', headers={**headers, 'If-None-Match': first.headers['ETag']})
+        self.assertEqual(second.status_code, 304)
+        self.assertEqual(second.get_data(), b'')
+    
+    def test_changed_body_returns_200(self):
+        client = _make_app().test_client()
+        response = client.get('/rows', headers={'Accept-Encoding': 'gzip', 'If-None-Match': '"0123456789abcdef:gzip"'})
+        self.assertEqual(response.status_code, 200)
+    
+    def test_stored_etag_skips_the_view(self):
+        app = _make_app(_DictCache())
+        client = app.test_client()
+        headers = {'Accept-Encoding': 'br'}
+        first = client.get('/rows', headers=headers)
+        
+        second = client.get('/rows', headers={**headers, 'If-None-Match': first.headers['ETag']})
+        self.assertEqual(second.status_code, 304)
+        self.assertEqual(app.view_calls, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,35 @@
+-- Migration to add indexes matching the portfolio and watchlist query predicates
+--
+-- Already covered elsewhere, so not repeated here:
+--   portfolios(user_id), watchlists(user_id)  -> idx_*_user_id in supabase_schema.sql
+--   (id, user_id) ownership probes            -> primary key lookup on id
+--   watchlist_items(watchlist_id, symbol)     -> UNIQUE constraint uq_watchlist_symbol
+--   stocks(symbol)                            -> UNIQUE index; symbols are stored and
+--                                                queried upper-cased, so no upper() index
+
+-- One position per stock per portfolio; also the conflict target for the
+-- INSERT ... ON CONFLICT upsert in add_position
+CREATE UNIQUE INDEX IF NOT EXISTS ix_positions_pid_sid
+    ON portfolio_positions (portfolio_id, stock_id);
+
+-- Newest-first transaction history per portfolio: the paged listing reads
+-- rows in index order instead of sorting; the INCLUDE columns let per-stock
+-- quantity/price scans be answered from the index alone
+CREATE INDEX IF NOT EXISTS ix_transactions_pid_date
+    ON transactions (portfolio_id, transaction_date DESC)
+    INCLUDE (stock_id, quantity, price);
+
+-- Active stock listings filtered by market/exchange
+CREATE INDEX IF NOT EXISTS ix_stocks_active_market_exchange
+    ON stocks (market, exchange)
+    WHERE is_active;
+
+-- Single-column indexes (SQLAlchemy and supabase_schema.sql names) made
+-- redundant by the composite indexes above
+-- (their column is the leading column of a wider index)
+DROP INDEX IF EXISTS ix_portfolio_positions_portfolio_id;
+DROP INDEX IF EXISTS ix_transactions_portfolio_id;
+DROP INDEX IF EXISTS ix_watchlist_items_watchlist_id;
+DROP INDEX IF EXISTS idx_positions_portfolio_id;
+DROP INDEX IF EXISTS idx_transactions_portfolio_id;
+DROP INDEX IF EXISTS idx_watchlist_items_watchlist_id;
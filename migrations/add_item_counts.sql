@@ -0,0 +1,46 @@
+-- Migration to keep denormalized child counts on watchlists and portfolios.
+-- The counts are maintained by triggers, so they stay correct for every write
+-- path, including the INSERT ... ON CONFLICT and bulk DELETE statements the
+-- API issues without going through the ORM unit of work.
+
+ALTER TABLE watchlists ADD COLUMN IF NOT EXISTS item_count INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE portfolios ADD COLUMN IF NOT EXISTS item_count INTEGER NOT NULL DEFAULT 0;
+
+-- Backfill from the current rows
+UPDATE watchlists w
+SET item_count = (SELECT COUNT(*) FROM watchlist_items i WHERE i.watchlist_id = w.id);
+
+UPDATE portfolios p
+SET item_count = (SELECT COUNT(*) FROM portfolio_positions pp WHERE pp.portfolio_id = p.id);
+
+CREATE OR REPLACE FUNCTION update_watchlist_item_count()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        UPDATE watchlists SET item_count = item_count + 1 WHERE id = NEW.watchlist_id;
+    ELSE
+        UPDATE watchlists SET item_count = item_count - 1 WHERE id = OLD.watchlist_id;
+    END IF;
+    RETURN NULL;
+END;
+$$ language 'plpgsql';
+
+CREATE OR REPLACE FUNCTION update_portfolio_item_count()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        UPDATE portfolios SET item_count = item_count + 1 WHERE id = NEW.portfolio_id;
+    ELSE
+        UPDATE portfolios SET item_count = item_count - 1 WHERE id = OLD.portfolio_id;
+    END IF;
+    RETURN NULL;
+END;
+$$ language 'plpgsql';
+
+DROP TRIGGER IF EXISTS watchlist_items_count ON watchlist_items;
+CREATE TRIGGER watchlist_items_count AFTER INSERT OR DELETE ON watchlist_items
+    FOR EACH ROW EXECUTE FUNCTION update_watchlist_item_count();
+
+DROP TRIGGER IF EXISTS portfolio_positions_count ON portfolio_positions;
+CREATE TRIGGER portfolio_positions_count AFTER INSERT OR DELETE ON portfolio_positions
+    FOR EACH ROW EXECUTE FUNCTION update_portfolio_item_count();
@@ -0,0 +1,34 @@
+-- Migration to add a long-format indicator table: one row per
+-- (stock, indicator, date). A query for one or two indicators over a date
+-- range reads only those rows through the primary key instead of the full
+-- 14-column technical_indicators row. Existing values are copied over.
+
+CREATE TABLE IF NOT EXISTS technical_indicator_values (
+    stock_id INTEGER NOT NULL REFERENCES stocks(id) ON DELETE CASCADE,
+    name VARCHAR(20) NOT NULL,
+    date DATE NOT NULL,
+    value DOUBLE PRECISION NOT NULL,
+    PRIMARY KEY (stock_id, name, date)
+);
+
+INSERT INTO technical_indicator_values (stock_id, name, date, value)
+SELECT ti.stock_id, v.name, ti.date, v.value
+FROM technical_indicators ti
+CROSS JOIN LATERAL (VALUES
+    ('sma_20', ti.sma_20),
+    ('sma_50', ti.sma_50),
+    ('sma_200', ti.sma_200),
+    ('ema_12', ti.ema_12),
+    ('ema_26', ti.ema_26),
+    ('rsi_14', ti.rsi_14),
+    ('macd', ti.macd),
+    ('macd_signal', ti.macd_signal),
+    ('macd_histogram', ti.macd_histogram),
+    ('bb_upper', ti.bb_upper),
+    ('bb_middle', ti.bb_middle),
+    ('bb_lower', ti.bb_lower),
+    ('atr_14', ti.atr_14),
+    ('adx_14', ti.adx_14)
+) AS v(name, value)
+WHERE v.value IS NOT NULL
+ON CONFLICT DO NOTHING;
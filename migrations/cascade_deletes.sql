@@ -0,0 +1,40 @@
+-- Migration to make parent deletes cascade inside PostgreSQL. The ORM
+-- relationships use passive_deletes=True and no longer load child rows
+-- just to delete them one by one.
+-- Each existing foreign key on the listed column is replaced by one with
+-- ON DELETE CASCADE; constraints already cascading are left untouched.
+
+DO $$
+DECLARE
+    fk RECORD;
+    con TEXT;
+BEGIN
+    FOR fk IN
+        SELECT * FROM (VALUES
+            ('portfolios', 'user_id', 'users'),
+            ('watchlists', 'user_id', 'users'),
+            ('saved_screeners', 'user_id', 'users'),
+            ('portfolio_positions', 'portfolio_id', 'portfolios'),
+            ('transactions', 'portfolio_id', 'portfolios'),
+            ('watchlist_items', 'watchlist_id', 'watchlists'),
+            ('stock_price_data', 'stock_id', 'stocks'),
+            ('technical_indicators', 'stock_id', 'stocks')
+        ) AS t(tbl, col, ref)
+    LOOP
+        SELECT c.conname INTO con
+        FROM pg_constraint c
+        JOIN pg_attribute a ON a.attrelid = c.conrelid AND a.attnum = ANY (c.conkey)
+        WHERE c.contype = 'f'
+          AND c.conrelid = fk.tbl::regclass
+          AND a.attname = fk.col
+          AND c.confdeltype <> 'c';
+        
+        IF con IS NOT NULL THEN
+            EXECUTE format('ALTER TABLE %I DROP CONSTRAINT %I', fk.tbl, con);
+            EXECUTE format(
+                'ALTER TABLE %I ADD CONSTRAINT %I FOREIGN KEY (%I) REFERENCES %I(id) ON DELETE CASCADE',
+                fk.tbl, con, fk.col, fk.ref);
+            RAISE NOTICE 'Made %.% cascade on delete', fk.tbl, fk.col;
+        END IF;
+    END LOOP;
+END $$;
@@ -0,0 +1,23 @@
+-- Migration to store prices, fees and share quantities as exact NUMERIC
+-- instead of double precision. Matches the Money (18,4) and Quantity (18,6)
+-- column types in models/__init__.py. Existing values are cast in place.
+
+ALTER TABLE portfolio_positions
+    ALTER COLUMN quantity TYPE NUMERIC(18, 6) USING quantity::numeric(18, 6),
+    ALTER COLUMN average_price TYPE NUMERIC(18, 4) USING average_price::numeric(18, 4);
+
+ALTER TABLE transactions
+    ALTER COLUMN quantity TYPE NUMERIC(18, 6) USING quantity::numeric(18, 6),
+    ALTER COLUMN price TYPE NUMERIC(18, 4) USING price::numeric(18, 4),
+    ALTER COLUMN fees TYPE NUMERIC(18, 4) USING fees::numeric(18, 4);
+
+ALTER TABLE stocks
+    ALTER COLUMN last_price TYPE NUMERIC(18, 4) USING last_price::numeric(18, 4),
+    ALTER COLUMN price_change TYPE NUMERIC(18, 4) USING price_change::numeric(18, 4);
+
+ALTER TABLE stock_price_data
+    ALTER COLUMN open TYPE NUMERIC(18, 4) USING open::numeric(18, 4),
+    ALTER COLUMN high TYPE NUMERIC(18, 4) USING high::numeric(18, 4),
+    ALTER COLUMN low TYPE NUMERIC(18, 4) USING low::numeric(18, 4),
+    ALTER COLUMN close TYPE NUMERIC(18, 4) USING close::numeric(18, 4),
+    ALTER COLUMN adj_close TYPE NUMERIC(18, 4) USING adj_close::numeric(18, 4);
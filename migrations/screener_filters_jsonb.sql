@@ -0,0 +1,5 @@
+-- Migration to store saved screener filters as JSONB (parsed once on write,
+-- binary on disk) instead of JSON text
+
+ALTER TABLE saved_screeners
+    ALTER COLUMN filters TYPE JSONB USING filters::jsonb;
@@ -0,0 +1,29 @@
+-- Migration to move created_at/updated_at to TIMESTAMPTZ with database-side
+-- defaults (now()). Existing values were written as naive UTC, so they are
+-- interpreted as UTC during the conversion.
+
+DO $$
+DECLARE
+    t TEXT;
+BEGIN
+    FOREACH t IN ARRAY ARRAY[
+        'users', 'portfolios', 'portfolio_positions', 'transactions', 'watchlists',
+        'watchlist_items', 'stocks', 'stock_price_data', 'technical_indicators',
+        'saved_screeners'
+    ] LOOP
+        EXECUTE format(
+            'ALTER TABLE %I ALTER COLUMN created_at TYPE TIMESTAMPTZ USING created_at AT TIME ZONE ''UTC'', '
+            'ALTER COLUMN created_at SET DEFAULT now()', t);
+        
+        IF EXISTS (
+            SELECT 1 FROM information_schema.columns
+            WHERE table_name = t AND column_name = 'updated_at'
+        ) THEN
+            EXECUTE format(
+                'ALTER TABLE %I ALTER COLUMN updated_at TYPE TIMESTAMPTZ USING updated_at AT TIME ZONE ''UTC'', '
+                'ALTER COLUMN updated_at SET DEFAULT now()', t);
+        END IF;
+        
+        RAISE NOTICE 'Converted timestamps on %', t;
+    END LOOP;
+END $$;